@@ -0,0 +1,452 @@
+"""
+Benchmark harness for the gallery's hot paths.
+
+    python -m benchmarks.run --vectors 100000 --images 200 --output results.json
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+
+Everything runs on seeded synthetic data in a temporary directory: a
+clustered embedding matrix of ``--vectors`` rows (1k to 1M) for the database,
+index and grid-paging benchmarks, and ``--images`` generated JPEGs for
+thumbnails, tagging and end-to-end ingestion. AIModelHandler runs with
+StubBackend in place of CLIP, so its preprocessing, batching and tagging
+code is timed without model weights. Sections whose dependencies are
+missing are reported as skipped.
+
+Results are written as JSON. With ``--baseline`` every metric is compared
+against a stored run and the exit status is 1 if any regressed by more than
+``--tolerance``. Baselines are machine specific; record one per machine.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from PIL import Image
+from config.settings import AppConfig
+from src.database.db_manager import DatabaseManager
+from src.database.embedding_store import EmbeddingStore
+from src.database.thumbnail_cache import ThumbnailCache
+
+
+def _percentiles(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {"p50_ms": float(np.percentile(samples, 50)), "p95_ms": float(np.percentile(samples, 95)),
+            "p99_ms": float(np.percentile(samples, 99))}
+
+
+def _make_config(workdir, args):
+    config = AppConfig()
+    config.DATA_DIR = config.MODELS_DIR = workdir
+    config.DATABASE_PATH = workdir / "gallery.db"
+    config.INDEX_PATH = workdir / "faiss.index"
+    config.THUMBNAIL_CACHE_DIR = workdir / "thumbnails"
+    config.DEVICE = "cpu"
+    config.INGEST_WORKERS = args.workers
+    config.BATCH_PROCESSING_SIZE = args.batch_size
+    return config
+
+
+def synthetic_embeddings(count, dim, seed, chunk_size=10000):
+    """Yield (start, chunk) blocks of a clustered embedding matrix.
+
+    Points scatter around a few hundred centres, which is closer to real
+    CLIP embeddings than uniform noise and gives IVF indexes realistic lists.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(min(256, max(1, count // 100)), dim)).astype(np.float32)
+    for start in range(0, count, chunk_size):
+        size = min(chunk_size, count - start)
+        chunk = centres[rng.integers(0, len(centres), size)] + 0.5 * rng.normal(size=(size, dim))
+        yield start, chunk.astype(np.float32)
+
+
+def synthetic_images(directory, count, size, seed):
+    """Write count JPEGs of the given (width, height); returns their paths"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    width, height = size
+    ramp = np.linspace(0, 1, width, dtype=np.float32)[None, :, None]
+    paths = []
+    for i in range(count):
+        colour = rng.integers(0, 256, 3).astype(np.float32)
+        noise = rng.normal(0, 20, (-(-height // 8), -(-width // 8), 3)).repeat(8, axis=0).repeat(8, axis=1)
+        pixels = np.clip(ramp * colour + noise[:height, :width], 0, 255).astype(np.uint8)
+        path = os.path.join(directory, f"image_{i:05d}.jpg")
+        Image.fromarray(pixels).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def bench_database(config, args, db):
+    labels = list(config.DEFAULT_LABELS)
+    rng = random.Random(args.seed)
+    write_seconds = 0.0
+    for start, chunk in synthetic_embeddings(args.vectors, args.dim, args.seed):
+        records = []
+        for offset, embedding in enumerate(chunk):
+            i = start + offset
+            tags = [(label, round(rng.random(), 3)) for label in rng.sample(labels, 3)]
+            records.append((f"/bench/{i // 1000:04d}/image_{i:07d}.jpg", f"image_{i:07d}.jpg", 100000,
+                            1024, 768, embedding, tags, rng.getrandbits(63), i, f"{i:032x}"))
+        for batch_start in range(0, len(records), args.write_batch):
+            begin = time.perf_counter()
+            db.add_processed_batch(records[batch_start:batch_start + args.write_batch])
+            write_seconds += time.perf_counter() - begin
+
+    results = {"write_images_per_sec": args.vectors / write_seconds}
+
+    begin = time.perf_counter()
+    db._read_all_embeddings()
+    results["read_all_blobs_seconds"] = time.perf_counter() - begin
+
+    db.embedding_store.invalidate()
+    begin = time.perf_counter()
+    db.get_all_embeddings()
+    results["read_all_store_rebuild_seconds"] = time.perf_counter() - begin
+    begin = time.perf_counter()
+    db.get_all_embeddings()
+    results["read_all_store_seconds"] = time.perf_counter() - begin
+
+    samples = []
+    for _ in range(args.repeats):
+        ids = [rng.randint(1, args.vectors) for _ in range(1000)]
+        begin = time.perf_counter()
+        db.get_embeddings_for_images(ids)
+        samples.append((time.perf_counter() - begin) * 1000)
+    results["embeddings_by_id_1000"] = _percentiles(samples)
+
+    samples = []
+    for _ in range(args.repeats):
+        begin = time.perf_counter()
+        db.get_images_with_tag(rng.choice(labels), min_confidence=0.5, limit=100)
+        samples.append((time.perf_counter() - begin) * 1000)
+    results["images_with_tag_top100"] = _percentiles(samples)
+    return results
+
+
+def bench_index(config, args, db):
+    import faiss
+    from src.search.search_engine import SearchEngine
+
+    rng = np.random.default_rng(args.seed)
+    query_ids = [int(i) for i in rng.integers(1, args.vectors + 1, args.queries)]
+    _, queries = db.get_embeddings_for_images(query_ids)
+    queries = np.array(queries, dtype=np.float32) + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+    faiss.normalize_L2(queries)
+
+    truth = None
+    results = {}
+    for index_type in ["flat"] + [t for t in args.index_types if t != "flat"]:
+        config.FAISS_INDEX_TYPE = index_type
+        engine = SearchEngine(db, None, config)
+        begin = time.perf_counter()
+        engine.build_index()
+        entry = {"build_seconds": time.perf_counter() - begin}
+
+        found = np.empty((len(queries), args.top_k), dtype=np.int64)
+        samples = []
+        for row in range(len(queries)):
+            begin = time.perf_counter()
+            _, found[row:row + 1] = engine.index.search(queries[row:row + 1], args.top_k)
+            samples.append((time.perf_counter() - begin) * 1000)
+        entry["query"] = _percentiles(samples)
+        if truth is None:
+            truth = found
+        entry["recall_at_k"] = float(np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(found, truth)]))
+
+        # Batched more-like-this queries through the full search_many path
+        batch = query_ids[:64]
+        begin = time.perf_counter()
+        for _ in range(args.repeats):
+            engine.search_many(batch, args.top_k)
+        entry["search_many_queries_per_sec"] = len(batch) * args.repeats / (time.perf_counter() - begin)
+        results[index_type] = entry
+    return results
+
+
+def bench_grid(config, args, db):
+    from src.gui.gallery_grid import DatabaseRowSource
+
+    source = DatabaseRowSource(db, config.IMAGES_PER_PAGE)
+    rows = min(len(source), args.grid_rows)
+    begin = time.perf_counter()
+    for index in range(rows):
+        source.get(index)
+    results = {"scroll_rows_per_sec": rows / (time.perf_counter() - begin)}
+
+    rng = random.Random(args.seed)
+    samples = []
+    for _ in range(args.repeats):
+        source = DatabaseRowSource(db, config.IMAGES_PER_PAGE)
+        index = rng.randrange(len(source))
+        begin = time.perf_counter()
+        source.get(index)
+        samples.append((time.perf_counter() - begin) * 1000)
+    results["jump"] = _percentiles(samples)
+    return results
+
+
+def bench_thumbnails(config, paths):
+    cache = ThumbnailCache(config.THUMBNAIL_CACHE_DIR, config.THUMBNAIL_SIZE, config.THUMBNAIL_FORMAT)
+    results = {}
+    for name in ("cold", "warm"):
+        samples = []
+        for path in paths:
+            begin = time.perf_counter()
+            cache.get_or_create(path)
+            samples.append((time.perf_counter() - begin) * 1000)
+        results[name] = _percentiles(samples)
+    shutil.rmtree(config.THUMBNAIL_CACHE_DIR, ignore_errors=True)
+    return results
+
+
+class StubBackend:
+    """Stands in for the CLIP encoders with fixed random projections.
+
+    Image embeddings come from 16x16 average-pooled pixels and text
+    embeddings from the token ids, so the output is deterministic and the
+    cost is negligible next to the handler code being measured.
+    """
+
+    def __init__(self, dim, seed):
+        rng = np.random.default_rng(seed)
+        self.image_projection = rng.normal(size=(3 * 16 * 16, dim)).astype(np.float32)
+        self.text_projection = rng.normal(size=(77, dim)).astype(np.float32)
+
+    def encode_image(self, pixels):
+        n, channels, height, width = pixels.shape
+        pooled = pixels.reshape(n, channels, 16, height // 16, 16, width // 16).mean(axis=(3, 5))
+        return pooled.reshape(n, -1) @ self.image_projection
+
+    def encode_text(self, tokens):
+        return np.asarray(tokens, dtype=np.float32) @ self.text_projection
+
+
+def stub_tokenize(texts, context_length=77):
+    """Stands in for clip.tokenize: byte values, zero-padded to context_length"""
+    if isinstance(texts, str):
+        texts = [texts]
+    tokens = np.zeros((len(texts), context_length), dtype=np.int64)
+    for row, text in enumerate(texts):
+        ids = list(text.encode("utf-8"))[:context_length]
+        tokens[row, :len(ids)] = ids
+    return tokens
+
+
+class StubPreprocess:
+    """CLIP-style preprocessing (resize, centre crop, normalize) in NumPy.
+
+    A class rather than a closure so that ingestion workers can unpickle it.
+    """
+
+    MEAN = np.array([0.48145466, 0.4578275, 0.40821073], dtype=np.float32)[:, None, None]
+    STD = np.array([0.26862954, 0.26130258, 0.27577711], dtype=np.float32)[:, None, None]
+
+    def __init__(self, resolution=224):
+        self.resolution = resolution
+
+    def __call__(self, image):
+        scale = self.resolution / min(image.size)
+        width, height = max(self.resolution, round(image.width * scale)), max(self.resolution, round(image.height * scale))
+        image = image.convert("RGB").resize((width, height), Image.BICUBIC)
+        left, top = (width - self.resolution) // 2, (height - self.resolution) // 2
+        image = image.crop((left, top, left + self.resolution, top + self.resolution))
+        pixels = np.asarray(image, dtype=np.float32).transpose(2, 0, 1) / 255.0
+        return (pixels - self.MEAN) / self.STD
+
+
+def _stub_handler(config, args):
+    from src.ai.model_handler import AIModelHandler
+
+    class StubModelHandler(AIModelHandler):
+        def load_model(self):
+            self.model = StubBackend(args.dim, args.seed)
+            self.backend = "stub"
+            self.preprocess = StubPreprocess(self._input_resolution)
+
+        def preprocess_text(self, texts):
+            return stub_tokenize(texts)
+
+    return StubModelHandler(config)
+
+
+def bench_model(config, args, paths):
+    handler = _stub_handler(config, args)
+    images = []
+    for path in paths[:args.batch_size * 4]:
+        with Image.open(path) as img:
+            images.append(img.convert("RGB"))
+
+    begin = time.perf_counter()
+    handler.label_embeddings()
+    results = {"label_embeddings_seconds": time.perf_counter() - begin}
+
+    begin = time.perf_counter()
+    pixels = handler._to_batch(images)
+    results["preprocess_images_per_sec"] = len(images) / (time.perf_counter() - begin)
+
+    begin = time.perf_counter()
+    for _ in range(args.repeats):
+        for start in range(0, len(pixels), args.batch_size):
+            handler.analyze(pixels[start:start + args.batch_size])
+    results["analyze_images_per_sec"] = len(pixels) * args.repeats / (time.perf_counter() - begin)
+    return results
+
+
+def bench_ingestion(config, args, image_dir):
+    from src.ingestion.pipeline import IngestionPipeline
+
+    config.DATABASE_PATH = config.DATA_DIR / "ingest.db"
+    db = DatabaseManager(config.DATABASE_PATH, EmbeddingStore(config.DATA_DIR, name="ingest",
+                                                              dtype=config.EMBEDDING_STORE_DTYPE))
+    thumbnail_cache = ThumbnailCache(config.THUMBNAIL_CACHE_DIR, config.THUMBNAIL_SIZE, config.THUMBNAIL_FORMAT)
+    pipeline = IngestionPipeline(db, _stub_handler(config, args), config, thumbnail_cache)
+    begin = time.perf_counter()
+    image_ids = pipeline.run(image_dir)
+    results = {"images_per_sec": len(image_ids) / (time.perf_counter() - begin)}
+    begin = time.perf_counter()
+    pipeline.run(image_dir)
+    results["rescan_unchanged_seconds"] = time.perf_counter() - begin
+    db.close()
+    return results
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="gallery-bench-")
+    try:
+        config = _make_config(Path(workdir), args)
+        only = set(args.only or ["database", "index", "grid", "thumbnails", "model", "ingestion"])
+        sections = {}
+
+        def section(name, func, *func_args):
+            if name not in only:
+                return
+            print(f"[{name}]", file=sys.stderr)
+            try:
+                sections[name] = func(*func_args)
+            except ImportError as e:
+                sections[name] = {"skipped": str(e)}
+
+        # The index and grid benchmarks run on the library the database benchmark writes
+        if only & {"index", "grid"}:
+            only.add("database")
+        db = DatabaseManager(config.DATABASE_PATH, EmbeddingStore(config.DATA_DIR, dtype=config.EMBEDDING_STORE_DTYPE))
+        section("database", bench_database, config, args, db)
+        section("index", bench_index, config, args, db)
+        section("grid", bench_grid, config, args, db)
+        db.close()
+
+        image_dir = os.path.join(workdir, "images")
+        paths = synthetic_images(image_dir, args.images, tuple(args.image_size), args.seed)
+        section("thumbnails", bench_thumbnails, config, paths)
+        section("model", bench_model, config, args, paths)
+        section("ingestion", bench_ingestion, config, args, image_dir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "parameters": {name: getattr(args, name) for name in
+                       ("vectors", "dim", "images", "image_size", "queries", "top_k", "index_types",
+                        "workers", "batch_size", "write_batch", "seed")},
+        "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                        "platform": platform.platform(), "cpus": os.cpu_count()},
+        "metrics": sections,
+    }
+
+
+def _flatten(metrics, prefix=""):
+    flat = {}
+    for name, value in metrics.items():
+        key = f"{prefix}{name}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, key + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[key] = float(value)
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    """Compare every shared metric; returns rows with a ``regression`` flag.
+
+    Throughputs (``*_per_sec``) and recall must not drop, and times
+    (``*_ms``, ``*_seconds``) must not grow, by more than ``tolerance``.
+    """
+    current, previous = _flatten(results["metrics"]), _flatten(baseline["metrics"])
+    rows = []
+    for name in sorted(set(current) & set(previous)):
+        old, new = previous[name], current[name]
+        change = (new - old) / old if old else 0.0
+        if name.endswith(("_per_sec", "recall_at_k")):
+            regression = change < -tolerance
+        elif name.endswith(("_ms", "_seconds")):
+            regression = change > tolerance
+        else:
+            regression = False
+        rows.append({"metric": name, "baseline": old, "current": new, "change": change, "regression": regression})
+    return rows
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=10000, help="embeddings in the synthetic library")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--images", type=int, default=64, help="synthetic image files")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[1600, 1200], metavar=("W", "H"))
+    parser.add_argument("--queries", type=int, default=200, help="queries for latency percentiles")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--index-types", nargs="+", default=["flat", "ivf_flat", "hnsw"],
+                        choices=["flat", "ivf_flat", "ivf_pq", "hnsw"])
+    parser.add_argument("--grid-rows", type=int, default=20000, help="rows scrolled in the grid benchmark")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--batch-size", type=int, default=32, help="inference batch size")
+    parser.add_argument("--write-batch", type=int, default=1000, help="records per database transaction")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", choices=["database", "index", "grid", "thumbnails", "model", "ingestion"])
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", help="also write the results to this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # Library code reports through print(); keep stdout for the results JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(args)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(text + "\n")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("parameters") != results["parameters"]:
+        print("Warning: baseline was recorded with different parameters", file=sys.stderr)
+    rows = compare(results, baseline, args.tolerance)
+    for row in rows:
+        marker = "REGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:<55} {row['baseline']:>12.3f} {row['current']:>12.3f} "
+              f"{row['change']:>+8.1%} {marker}", file=sys.stderr)
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,27 +22,62 @@ class AppConfig:
 
         # Database settings
         self.DATABASE_PATH = self.DATA_DIR / "gallery.db"
+        self.EMBEDDING_STORE_DTYPE = "float16"  # Memory-mapped embedding matrix: float16 or float32
 
         # AI Model settings
         self.CLIP_MODEL_NAME = "ViT-B/32"  # Options: ViT-B/32, ViT-B/16, ViT-L/14
-        self.DEVICE = "cuda" if self._check_cuda() else "cpu"
+        self._device = None  # Resolved on first access to DEVICE; probing CUDA imports torch
         self.TAG_CONFIDENCE_THRESHOLD = 0.1
         self.MAX_TAGS_PER_IMAGE = 10
+        self.RETAG_CHUNK_SIZE = 8192  # Stored embeddings scored and rewritten per transaction when re-tagging
+        self.INFERENCE_BACKEND = "torch"  # Options: torch, torch_int8, onnx (the last two CPU-only, cached in MODELS_DIR)
+        self.ONNX_INTRA_OP_THREADS = os.cpu_count() or 1
+        self.PRELOAD_MODEL = True  # Load CLIP in the background at startup; False waits until first use
 
         # Search and GUI settings
-        self.FAISS_INDEX_TYPE = "IndexFlatIP"  # Inner product for CLIP
+        self.FAISS_INDEX_TYPE = "auto"  # Options: auto, flat, ivf_flat, ivf_pq, hnsw (all inner product)
+        self.FAISS_AUTO_IVF_THRESHOLD = 50000  # auto: flat below this many vectors
+        self.FAISS_AUTO_PQ_THRESHOLD = 500000  # auto: IVF-PQ from this many vectors on
+        self.FAISS_NLIST = None  # IVF lists; None derives ~4*sqrt(n)
+        self.FAISS_NPROBE = 16  # IVF lists visited per query
+        self.FAISS_PQ_M = 64  # PQ sub-quantizers (bytes per vector)
+        self.FAISS_HNSW_M = 32  # HNSW graph degree
+        self.FAISS_EF_SEARCH = 64  # HNSW candidate list size per query
+        self.FAISS_TRAIN_SAMPLE_SIZE = 100000  # Vectors sampled to train IVF/PQ
+        self.INDEX_PATH = self.DATA_DIR / "faiss.index"  # Persisted; flat and HNSW are memory-mapped on startup
         self.SIMILARITY_SEARCH_TOP_K = 20
         self.SEARCH_RESULTS_LIMIT = 100
+        self.QUERY_CACHE_SIZE = 256  # Encoded text queries kept in memory
+        self.FILTER_EXACT_MAX_IDS = 20000  # Filtered search scores at most this many matches exactly, bypassing the index
+
+        # Shared local search service (python -m src serve)
+        self.SEARCH_SERVICE_HOST = "127.0.0.1"
+        self.SEARCH_SERVICE_PORT = 8765
+        self.SEARCH_SERVICE_URL = None  # e.g. "http://127.0.0.1:8765"; the GUI then searches through the service
+        self.SEARCH_SERVICE_BATCH_WINDOW_MS = 5  # How long a query waits for others to share its batch
+        self.SEARCH_SERVICE_MAX_BATCH = 64  # Queries per forward pass and FAISS search
+
+        # Near-duplicate detection
+        self.DEDUP_SIMILARITY_THRESHOLD = 0.95  # Min cosine similarity of candidate pairs
+        self.DEDUP_MAX_HASH_DISTANCE = 12  # Max perceptual-hash bit difference to confirm a pair
+        self.DEDUP_BLOCK_SIZE = 1024  # Query vectors per range search
         self.WINDOW_WIDTH = 1200
         self.WINDOW_HEIGHT = 800
         self.THUMBNAIL_SIZE = (200, 200)
-        self.IMAGES_PER_PAGE = 12
+        self.THUMBNAIL_CACHE_DIR = self.DATA_DIR / "thumbnails"
+        self.THUMBNAIL_FORMAT = "JPEG"  # JPEG or WEBP
+        self.THUMBNAIL_MEMORY_CACHE_SIZE = 500  # PhotoImage objects kept in memory
+        self.IMAGES_PER_PAGE = 200  # Rows fetched per database page by the grid
+        self.VIEWER_IMAGE_SIZE = (500, 400)  # Largest size an image is shown at in the viewer
+        self.VIEWER_PREFETCH = 2  # Neighbours decoded ahead on each side while flipping through images
+        self.VIEWER_CACHE_MB = 256  # Memory for decoded viewer images, shared by all viewer windows
         self.GRID_COLUMNS = 4
 
         # Image processing settings
         self.SUPPORTED_FORMATS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp', '.gif'}
         self.MAX_IMAGE_SIZE = 50 * 1024 * 1024  # 50MB max
         self.BATCH_PROCESSING_SIZE = 10  # Images to process at once
+        self.INGEST_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # Decode/preprocess processes
 
         # Default labels for tag generation (expand as needed)
         self.DEFAULT_LABELS = [
@@ -58,6 +93,16 @@ class AppConfig:
             "football", "soccer", "basketball", "tennis", "guitar"
         ]
 
+    @property
+    def DEVICE(self):
+        if self._device is None:
+            self._device = "cuda" if self._check_cuda() else "cpu"
+        return self._device
+
+    @DEVICE.setter
+    def DEVICE(self, value):
+        self._device = value
+
     def _check_cuda(self):
         try:
             import torch
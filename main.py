@@ -1,13 +1,21 @@
+import time
+_START = time.perf_counter()
+
 import sys, os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
+# Only lightweight modules are imported here; torch, clip and faiss load in
+# the background once the window is up
 from src.gui.main_window import GalleryApp
+from src.gui.startup_timer import StartupTimer
 from config.settings import AppConfig
 
 def main():
+    timer = StartupTimer(_START)
+    timer.mark("imports")
     config = AppConfig()
-    app = GalleryApp(config)
+    app = GalleryApp(config, timer)
     app.run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,102 @@
+"""
+Inference backends for the CLIP encoders.
+
+Every backend takes preprocessed pixels as an (N, 3, H, W) float32 array and
+tokenized text as returned by ``clip.tokenize``, and returns raw float32
+embeddings as NumPy arrays, so AIModelHandler does not care which one runs.
+"""
+
+import os
+import numpy as np
+import torch
+
+BACKENDS = ("torch", "torch_int8", "onnx")
+
+
+class TorchBackend:
+    """The CLIP model as loaded by clip.load (fp32 on CPU, fp16 on CUDA)"""
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def encode_image(self, pixels):
+        batch = torch.from_numpy(np.ascontiguousarray(pixels, dtype=np.float32)).to(self.device)
+        with torch.no_grad():
+            return self.model.encode_image(batch).float().cpu().numpy()
+
+    def encode_text(self, tokens):
+        with torch.no_grad():
+            return self.model.encode_text(tokens.to(self.device)).float().cpu().numpy()
+
+
+def load_torch_int8(model, cache_path):
+    """Dynamically quantize the model's Linear layers to int8 (CPU only).
+
+    The quantized model is pickled to cache_path and reused on later starts.
+    """
+    if os.path.exists(cache_path):
+        try:
+            return TorchBackend(torch.load(cache_path, map_location="cpu", weights_only=False), "cpu")
+        except Exception as e:
+            print(f"Error reading quantized model cache, re-quantizing: {e}")
+    quantized = torch.quantization.quantize_dynamic(model.float().cpu().eval(), {torch.nn.Linear}, dtype=torch.qint8)
+    try:
+        torch.save(quantized, cache_path)
+    except Exception as e:
+        print(f"Error writing quantized model cache: {e}")
+    return TorchBackend(quantized, "cpu")
+
+
+class _TextEncoder(torch.nn.Module):
+    # encode_text is a method, not a module; wrap it so it can be exported
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, tokens):
+        return self.model.encode_text(tokens)
+
+
+class OnnxBackend:
+    """Image and text encoders exported to ONNX and run with ONNX Runtime on CPU"""
+
+    def __init__(self, visual_path, text_path, intra_op_threads):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        # One request at a time: parallelism comes from intra-op threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        providers = ["CPUExecutionProvider"]
+        self.visual = ort.InferenceSession(visual_path, options, providers=providers)
+        self.text = ort.InferenceSession(text_path, options, providers=providers)
+
+    def encode_image(self, pixels):
+        pixels = np.ascontiguousarray(pixels, dtype=np.float32)
+        return self.visual.run(None, {"pixels": pixels})[0].astype(np.float32)
+
+    def encode_text(self, tokens):
+        tokens = np.asarray(tokens.cpu().numpy() if hasattr(tokens, "cpu") else tokens, dtype=np.int64)
+        return self.text.run(None, {"tokens": tokens})[0].astype(np.float32)
+
+
+def load_onnx(model, input_resolution, visual_path, text_path, intra_op_threads):
+    """Export the encoders to ONNX once, then open them with ONNX Runtime"""
+    if not (os.path.exists(visual_path) and os.path.exists(text_path)):
+        model = model.float().cpu().eval()
+        pixels = torch.zeros(1, 3, input_resolution, input_resolution)
+        tokens = torch.zeros(1, 77, dtype=torch.int64)
+        with torch.no_grad():
+            _export(model.visual, pixels, visual_path, "pixels")
+            _export(_TextEncoder(model), tokens, text_path, "tokens")
+    return OnnxBackend(visual_path, text_path, intra_op_threads)
+
+
+def _export(module, example, path, input_name):
+    tmp_path = path + ".tmp"
+    torch.onnx.export(module, example, tmp_path, input_names=[input_name], output_names=["embedding"],
+                      dynamic_axes={input_name: {0: "batch"}, "embedding": {0: "batch"}}, opset_version=14)
+    os.replace(tmp_path, path)
@@ -1,5 +1,5 @@
-import torch
-import clip
+import hashlib
+import os
 import numpy as np
 from PIL import Image
 
@@ -7,51 +7,163 @@ class AIModelHandler:
     def __init__(self, config):
         self.config = config
         self.device = config.DEVICE
-        self.model = None
+        self.model = None  # Encoder backend (see backends.py); None if loading failed
+        self.backend = None
         self.preprocess = None
+        self.logit_scale = 100.0
+        self._input_resolution = 224
+        self._label_embeddings = None
+        self._label_key = None
         self.load_model()
-    
+
     def load_model(self):
         try:
-            self.model, self.preprocess = clip.load(self.config.CLIP_MODEL_NAME, device=self.device)
-            print(f"CLIP model loaded on {self.device}")
+            # clip and the backends import torch; only pay for that once a model is loaded
+            import clip
+            model, self.preprocess = clip.load(self.config.CLIP_MODEL_NAME, device=self.device)
+            self.logit_scale = float(model.logit_scale.exp().item())
+            self._input_resolution = int(model.visual.input_resolution)
+            self.model, self.backend = self._load_backend(model)
+            print(f"CLIP model loaded on {self.device} ({self.backend} backend)")
         except Exception as e:
             print(f"Error loading CLIP: {e}")
             self.model = None
-    
-    def extract_features(self, image_path):
-        if not self.model:
-            return None
+
+    def _load_backend(self, model):
+        from .backends import BACKENDS, TorchBackend, load_torch_int8, load_onnx
+        backend = self.config.INFERENCE_BACKEND
+        if backend not in BACKENDS:
+            print(f"Unknown inference backend '{backend}', using torch.")
+            backend = "torch"
+        if backend != "torch" and self.device != "cpu":
+            # int8 dynamic quantization and the ONNX export target CPU inference
+            print(f"Inference backend '{backend}' is CPU-only, using torch on {self.device}.")
+            backend = "torch"
+
+        cache_prefix = os.path.join(self.config.MODELS_DIR, self.config.CLIP_MODEL_NAME.replace("/", "-"))
         try:
-            image = self.preprocess(Image.open(image_path)).unsqueeze(0).to(self.device)
-            with torch.no_grad():
-                image_features = self.model.encode_image(image)
-                # Convert to CPU numpy array and flatten
-                return image_features.cpu().numpy().astype(np.float32).flatten()
+            if backend == "torch_int8":
+                return load_torch_int8(model, f"{cache_prefix}_int8.pt"), backend
+            if backend == "onnx":
+                return load_onnx(model, self._input_resolution, f"{cache_prefix}_visual.onnx",
+                                 f"{cache_prefix}_text.onnx", self.config.ONNX_INTRA_OP_THREADS), backend
         except Exception as e:
-            print(f"Error extracting features: {e}")
+            print(f"Error loading {backend} backend, falling back to torch: {e}")
+        return TorchBackend(model, self.device), "torch"
+
+    def extract_features(self, image_path):
+        if not self.model:
             return None
-    
+        features, _ = self.analyze([image_path])
+        return features[0] if features is not None else None
+
     def generate_tags(self, image_path):
         if not self.model:
             return []
-        
+        _, tags = self.analyze([image_path])
+        return tags[0]
+
+    def input_resolution(self):
+        """Side length (pixels) of the square image the visual encoder expects"""
+        return self._input_resolution
+
+    def analyze(self, images):
+        """Encode images once and derive both embeddings and tags from that pass.
+
+        ``images`` is either a stacked (N, 3, H, W) array of preprocessed
+        pixels or a list of image paths / PIL images. Returns
+        ``(features, tags)`` where ``features`` is an (N, D) float32 array of
+        raw CLIP image embeddings and ``tags`` holds a list of
+        ``(label, confidence)`` pairs per image.
+        """
+        if not self.model or len(images) == 0:
+            return None, [[] for _ in range(len(images))]
         try:
-            image = self.preprocess(Image.open(image_path)).unsqueeze(0).to(self.device)
-            text = clip.tokenize(self.config.DEFAULT_LABELS).to(self.device)
-            
-            with torch.no_grad():
-                logits_per_image, _ = self.model(image, text)
-                probs = logits_per_image.softmax(dim=-1).cpu().numpy().flatten()
-            
-            # Filter tags by confidence threshold
-            threshold = self.config.TAG_CONFIDENCE_THRESHOLD
-            top_indices = np.where(probs > threshold)[0]
-            
-            tags = [(self.config.DEFAULT_LABELS[idx], float(probs[idx])) for idx in top_indices]
-            tags.sort(key=lambda x: x[1], reverse=True)
-         
-            return tags[:self.config.MAX_TAGS_PER_IMAGE]
+            features = self.model.encode_image(self._to_batch(images)).astype(np.float32)
+            return features, self._tags_from_features(features)
         except Exception as e:
-            print(f"Error generating tags: {e}")
-            return []
+            print(f"Error analyzing images: {e}")
+            return None, [[] for _ in range(len(images))]
+
+    def label_embeddings(self):
+        """Normalized text embeddings for DEFAULT_LABELS, one row per label.
+
+        Computed once per model/label set and persisted to MODELS_DIR, so the
+        text encoder only runs again when either of them changes.
+        """
+        key = self._label_cache_key()
+        if self._label_embeddings is not None and self._label_key == key:
+            return self._label_embeddings
+
+        cache_path = self.config.MODELS_DIR / f"labels_{key}.npy"
+        embeddings = None
+        if cache_path.exists():
+            try:
+                embeddings = np.load(cache_path)
+            except Exception as e:
+                print(f"Error reading label cache: {e}")
+        if embeddings is None or embeddings.shape[0] != len(self.config.DEFAULT_LABELS):
+            embeddings = self._encode_labels()
+            try:
+                np.save(cache_path, embeddings)
+            except Exception as e:
+                print(f"Error writing label cache: {e}")
+
+        self._label_embeddings = embeddings
+        self._label_key = key
+        return embeddings
+
+    def preprocess_text(self, texts):
+        """Tokenize a string or list of strings for the text encoder"""
+        import clip
+        return clip.tokenize(texts, truncate=True)
+
+    def encode_text(self, tokens):
+        """Encode tokenized text into L2-normalized float32 embeddings, one row per text"""
+        text_features = self.model.encode_text(tokens).astype(np.float32)
+        return text_features / np.linalg.norm(text_features, axis=1, keepdims=True)
+
+    def _encode_labels(self):
+        return self.encode_text(self.preprocess_text(self.config.DEFAULT_LABELS))
+
+    def _label_cache_key(self):
+        source = "\n".join([self.config.CLIP_MODEL_NAME] + list(self.config.DEFAULT_LABELS))
+        return hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+    def _to_batch(self, images):
+        if isinstance(images, np.ndarray):
+            return images
+        pixels = []
+        for image in images:
+            if not isinstance(image, Image.Image):
+                image = Image.open(image)
+            pixels.append(np.asarray(self.preprocess(image), dtype=np.float32))
+        return np.stack(pixels)
+
+    def tag_probabilities(self, features):
+        """(N, len(DEFAULT_LABELS)) label probabilities for raw image embeddings.
+
+        Same scoring as CLIP's forward(): scaled cosine similarity, softmax
+        over labels. Only needs the cached label embeddings, not the image
+        encoder, so stored embeddings can be re-tagged without decoding.
+        """
+        label_embeddings = self.label_embeddings()
+        normalized = features / np.linalg.norm(features, axis=1, keepdims=True)
+        logits = self.logit_scale * normalized @ label_embeddings.T
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        return probs
+
+    def _tags_from_features(self, features):
+        return [self._select_tags(row) for row in self.tag_probabilities(features)]
+
+    def _select_tags(self, probs):
+        # Filter tags by confidence threshold
+        threshold = self.config.TAG_CONFIDENCE_THRESHOLD
+        top_indices = np.where(probs > threshold)[0]
+
+        tags = [(self.config.DEFAULT_LABELS[idx], float(probs[idx])) for idx in top_indices]
+        tags.sort(key=lambda x: x[1], reverse=True)
+
+        return tags[:self.config.MAX_TAGS_PER_IMAGE]
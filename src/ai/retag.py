@@ -0,0 +1,54 @@
+import time
+import numpy as np
+
+
+def select_tags(probs, threshold, max_tags):
+    """Vectorized AIModelHandler._select_tags over an (N, L) probability matrix.
+
+    Returns ``(rows, labels, confidences)`` arrays with one entry per kept
+    tag: the label probability is above threshold and among the row's
+    max_tags most probable labels.
+    """
+    k = min(max_tags, probs.shape[1])
+    if k <= 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=probs.dtype)
+    top = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+    top_probs = np.take_along_axis(probs, top, axis=1)
+    rows, columns = np.nonzero(top_probs > threshold)
+    return rows, top[rows, columns], top_probs[rows, columns]
+
+
+def retag_library(db_manager, ai_handler, config, progress_callback=None):
+    """Recompute every image's tags from its stored embedding.
+
+    Runs the text encoder once for DEFAULT_LABELS (or reuses the cached
+    label embeddings), then scores the stored image embeddings in chunks of
+    RETAG_CHUNK_SIZE with one matrix multiply and softmax per chunk, and
+    replaces each chunk's tags in its own transaction. No image is decoded,
+    and memory is bounded by one chunk. ``progress_callback(done, total)``
+    is called after each chunk. Returns ``{"images", "tags", "seconds"}``.
+    """
+    start = time.perf_counter()
+    labels = list(config.DEFAULT_LABELS)
+    ai_handler.label_embeddings()
+    label_ids = db_manager.get_label_ids(labels)
+    label_ids = np.array([label_ids[label] for label in labels], dtype=np.int64)
+
+    total = db_manager.get_stats()["embeddings"]
+    images = tags = 0
+    for image_ids, embeddings in db_manager.iter_embeddings(config.RETAG_CHUNK_SIZE):
+        # Insert in primary-key order; the tags table is clustered on image_id
+        order = np.argsort(image_ids)
+        image_ids, embeddings = image_ids[order], embeddings[order]
+        probs = ai_handler.tag_probabilities(embeddings)
+        rows, columns, confidences = select_tags(probs, config.TAG_CONFIDENCE_THRESHOLD,
+                                                 config.MAX_TAGS_PER_IMAGE)
+        db_manager.replace_tags_many(image_ids.tolist(), list(zip(image_ids[rows].tolist(),
+                                                                  label_ids[columns].tolist(),
+                                                                  confidences.astype(float).tolist())))
+        images += len(image_ids)
+        tags += len(rows)
+        if progress_callback:
+            progress_callback(images, total)
+    return {"images": images, "tags": tags, "seconds": time.perf_counter() - start}
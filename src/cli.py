@@ -0,0 +1,332 @@
+"""
+Headless command-line interface for batch jobs.
+
+Run as ``python -m src <command>`` from the project root. The commands
+(ingest, reindex, search, dedup, retag, stats, serve) use the same database,
+embedding store, thumbnail cache and persisted search index as the desktop
+app but never import tkinter, so they work on machines without a display. With
+``--json`` every result is written to stdout as one JSON object per line,
+and diagnostics from the library go to stderr.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from config.settings import AppConfig
+from .database.db_manager import DatabaseManager
+from .database.embedding_store import EmbeddingStore
+from .database.thumbnail_cache import ThumbnailCache
+# torch, clip and faiss are imported by the commands that need them
+
+
+class _Output:
+    """Writes one record per line, as JSON or as human-readable text"""
+
+    def __init__(self, stream, json_lines):
+        self.stream = stream
+        self.json_lines = json_lines
+
+    def emit(self, record, text):
+        self.stream.write((json.dumps(record) if self.json_lines else text) + "\n")
+        self.stream.flush()
+
+
+def _load_model(args, config):
+    from .ai.model_handler import AIModelHandler
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+    ai_handler = AIModelHandler(config)
+    return ai_handler if ai_handler.model is not None else None
+
+
+def _load_search_engine(db_manager, ai_handler, config):
+    from .search.search_engine import SearchEngine
+    engine = SearchEngine(db_manager, ai_handler, config)
+    engine.load_or_build_index()
+    return engine
+
+
+def cmd_ingest(args, config, db_manager, out):
+    from .ingestion.pipeline import IngestionPipeline
+    from .search.dedup import DuplicateFinder
+
+    folders = [os.path.abspath(folder) for folder in args.folders]
+    # A missing folder would make every image under it look deleted
+    missing = [folder for folder in folders if not os.path.isdir(folder)]
+    if missing:
+        for folder in missing:
+            out.emit({"event": "error", "folder": folder, "error": "not a directory"},
+                     f"Not a directory: {folder}")
+        return 1
+
+    ai_handler = _load_model(args, config)
+    if ai_handler is None:
+        out.emit({"event": "error", "error": "model failed to load"}, "Cannot ingest: the AI model failed to load")
+        return 1
+    engine = _load_search_engine(db_manager, ai_handler, config)
+    thumbnail_cache = None
+    if not args.no_thumbnails:
+        thumbnail_cache = ThumbnailCache(config.THUMBNAIL_CACHE_DIR, config.THUMBNAIL_SIZE, config.THUMBNAIL_FORMAT)
+    pipeline = IngestionPipeline(db_manager, ai_handler, config, thumbnail_cache)
+    finder = DuplicateFinder(db_manager, engine, config)
+
+    def report_progress(folder):
+        def report(done, total, images_per_sec):
+            out.emit({"event": "progress", "folder": folder, "done": done, "total": total,
+                      "images_per_sec": round(images_per_sec, 2)},
+                     f"{folder}: {done}/{total} images ({images_per_sec:.1f} images/sec)")
+        return report
+
+    status = 0
+    for folder in folders:
+        start = time.perf_counter()
+        try:
+            image_ids = pipeline.run(folder, progress_callback=report_progress(folder) if args.progress else None,
+                                     batch_callback=engine.add_embeddings, removed_callback=engine.remove_images)
+            engine.save_index()
+            clusters = 0 if args.no_dedup else finder.update(image_ids)
+        except Exception as e:
+            out.emit({"event": "error", "folder": folder, "error": str(e)}, f"Error processing {folder}: {e}")
+            status = 1
+            continue
+        scan = pipeline.last_scan
+        record = {"event": "ingested", "folder": folder, "processed": len(image_ids),
+                  "unchanged": scan.unchanged if scan else 0, "removed": len(scan.vanished) if scan else 0,
+                  "duplicate_clusters": clusters, "seconds": round(time.perf_counter() - start, 3)}
+        out.emit(record, f"{folder}: {record['processed']} processed, {record['unchanged']} unchanged, "
+                         f"{record['removed']} removed, {clusters} duplicate groups updated "
+                         f"in {record['seconds']:.1f}s")
+    return status
+
+
+def cmd_reindex(args, config, db_manager, out):
+    from .search.search_engine import SearchEngine
+    engine = SearchEngine(db_manager, None, config)
+    start = time.perf_counter()
+    engine.build_index()
+    seconds = time.perf_counter() - start
+    count = int(engine.index.ntotal) if engine.index is not None else 0
+    out.emit({"event": "reindexed", "index_type": engine.index_type, "count": count, "seconds": round(seconds, 3)},
+             f"Built {engine.index_type} index with {count} images in {seconds:.1f}s")
+    if args.report:
+        for row in engine.index_report(k=args.top_k):
+            out.emit(dict(row, event="index_report"),
+                     f"{row['index_type']:>8}: recall@{args.top_k} {row['recall_at_k']:.3f}, "
+                     f"{row['latency_ms']:.2f} ms/query, built in {row['build_seconds']:.1f}s, "
+                     f"{row['size_bytes'] / 1e6:.1f} MB")
+    return 0
+
+
+def cmd_search(args, config, db_manager, out):
+    texts = list(args.queries)
+    if "-" in texts:
+        texts.remove("-")
+        texts.extend(line.strip() for line in sys.stdin if line.strip())
+    queries = texts + list(args.image)
+    if not queries:
+        out.emit({"event": "error", "error": "no queries"}, "Nothing to search for")
+        return 1
+
+    ai_handler = _load_model(args, config) if texts else None
+    if texts and ai_handler is None:
+        out.emit({"event": "error", "error": "model failed to load"}, "Cannot search text: the AI model failed to load")
+        return 1
+    engine = _load_search_engine(db_manager, ai_handler, config)
+
+    filters = {name: getattr(args, name) for name in
+               ("tags", "min_confidence", "folder", "created_after", "created_before",
+                "min_width", "max_width", "min_height", "max_height") if getattr(args, name)}
+    start = time.perf_counter()
+    if filters:
+        results = []
+        for query in queries:
+            hits, _ = engine.search_filtered(query, args.top_k, **filters)
+            results.append([(image_id, score) for image_id, _, score in hits])
+    else:
+        # All queries go through one batched encode and one FAISS search
+        results = engine.search_many(queries, args.top_k)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    paths = db_manager.get_image_paths({image_id for hits in results for image_id, _ in hits})
+    for query, hits in zip(queries, results):
+        hits = [(image_id, score) for image_id, score in hits if image_id in paths]
+        record = {"event": "results", "query": query,
+                  "results": [{"id": image_id, "path": paths[image_id], "score": round(score, 4)}
+                              for image_id, score in hits]}
+        lines = [f"{query!r}: {len(hits)} results"]
+        lines.extend(f"  {score:.4f}  {paths[image_id]}" for image_id, score in hits)
+        out.emit(record, "\n".join(lines))
+    out.emit({"event": "timing", "queries": len(queries), "ms": round(elapsed_ms, 2)},
+             f"{len(queries)} queries in {elapsed_ms:.1f} ms")
+    return 0
+
+
+def cmd_dedup(args, config, db_manager, out):
+    from .search.dedup import DuplicateFinder
+    engine = _load_search_engine(db_manager, None, config)
+    start = time.perf_counter()
+    count = DuplicateFinder(db_manager, engine, config).rebuild()
+    seconds = time.perf_counter() - start
+    out.emit({"event": "deduplicated", "clusters": count, "seconds": round(seconds, 3)},
+             f"Found {count} duplicate groups in {seconds:.1f}s")
+    if args.list:
+        clusters = db_manager.get_duplicate_clusters()
+        paths = db_manager.get_image_paths({image_id for members in clusters for image_id in members})
+        for members in clusters:
+            members = [image_id for image_id in members if image_id in paths]
+            out.emit({"event": "cluster", "cluster_id": members[0] if members else None,
+                      "images": [{"id": image_id, "path": paths[image_id]} for image_id in members]},
+                     "\n".join([f"Group {members[0] if members else '-'}:"]
+                               + [f"  {paths[image_id]}" for image_id in members]))
+    return 0
+
+
+def cmd_stats(args, config, db_manager, out):
+    stats = db_manager.get_stats()
+    stats["database_bytes"] = sum(os.path.getsize(path) for path in
+                                  (str(config.DATABASE_PATH), f"{config.DATABASE_PATH}-wal")
+                                  if os.path.exists(path))
+    # Read the index sidecar rather than the index itself, so faiss is not needed
+    meta_path = config.INDEX_PATH.with_suffix(".json")
+    index = None
+    if meta_path.exists():
+        try:
+            with open(meta_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+    stats["index"] = None if index is None else {
+        "type": index.get("index_type"), "count": index.get("count"),
+        "fresh": index.get("generation") == stats["generation"],
+        "bytes": os.path.getsize(config.INDEX_PATH) if config.INDEX_PATH.exists() else 0,
+    }
+    lines = [f"{name}: {value}" for name, value in stats.items() if name != "index"]
+    if index is None:
+        lines.append("index: none")
+    else:
+        state = "up to date" if stats["index"]["fresh"] else "stale"
+        lines.append(f"index: {stats['index']['type']}, {stats['index']['count']} vectors, {state}")
+    out.emit(dict(stats, event="stats"), "\n".join(lines))
+    return 0
+
+
+def cmd_retag(args, config, db_manager, out):
+    from .ai.retag import retag_library
+    ai_handler = _load_model(args, config)
+    if ai_handler is None:
+        out.emit({"event": "error", "error": "model failed to load"}, "Cannot re-tag: the AI model failed to load")
+        return 1
+
+    def report(done, total):
+        out.emit({"event": "progress", "done": done, "total": total}, f"{done}/{total} images re-tagged")
+
+    summary = retag_library(db_manager, ai_handler, config, report if args.progress else None)
+    out.emit(dict(summary, event="retagged", seconds=round(summary["seconds"], 3)),
+             f"Re-tagged {summary['images']} images with {summary['tags']} tags in {summary['seconds']:.1f}s")
+    return 0
+
+
+def cmd_serve(args, config, db_manager, out):
+    from .service.server import SearchService
+    ai_handler = _load_model(args, config)
+    if ai_handler is None:
+        out.emit({"event": "error", "error": "model failed to load"}, "Cannot serve: the AI model failed to load")
+        return 1
+    engine = _load_search_engine(db_manager, ai_handler, config)
+    thumbnail_cache = ThumbnailCache(config.THUMBNAIL_CACHE_DIR, config.THUMBNAIL_SIZE, config.THUMBNAIL_FORMAT)
+    SearchService(db_manager, engine, thumbnail_cache, config).run(args.host, args.port)
+    return 0
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", help="write results as JSON lines")
+    common.add_argument("--backend", choices=("torch", "torch_int8", "onnx"),
+                        help="inference backend (default: INFERENCE_BACKEND)")
+    common.add_argument("--device", help="torch device, e.g. cpu or cuda (default: auto)")
+    common.add_argument("--threads", type=int, help="intra-op threads for model inference")
+
+    parser = argparse.ArgumentParser(prog="python -m src", description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", parents=[common], help="add or refresh the images in folders")
+    ingest.add_argument("folders", nargs="+")
+    ingest.add_argument("--workers", type=int, help="decode processes (default: INGEST_WORKERS)")
+    ingest.add_argument("--batch-size", type=int, help="images per inference batch (default: BATCH_PROCESSING_SIZE)")
+    ingest.add_argument("--progress", action="store_true", help="report progress after every batch")
+    ingest.add_argument("--no-thumbnails", action="store_true", help="do not write grid thumbnails")
+    ingest.add_argument("--no-dedup", action="store_true", help="skip duplicate clustering")
+    ingest.set_defaults(handler=cmd_ingest)
+
+    reindex = commands.add_parser("reindex", parents=[common], help="rebuild the search index from the database")
+    reindex.add_argument("--index-type", choices=("auto", "flat", "ivf_flat", "ivf_pq", "hnsw"),
+                         help="index type (default: FAISS_INDEX_TYPE)")
+    reindex.add_argument("--report", action="store_true", help="compare recall and latency of every index type")
+    reindex.add_argument("--top-k", type=int, default=10, help="k for the recall report")
+    reindex.set_defaults(handler=cmd_reindex)
+
+    search = commands.add_parser("search", parents=[common], help="text or more-like-this search")
+    search.add_argument("queries", nargs="*", help="text queries; '-' reads one query per line from stdin")
+    search.add_argument("--image", type=int, action="append", default=[], metavar="ID",
+                        help="find images similar to this image id (repeatable)")
+    search.add_argument("--top-k", type=int, default=10)
+    search.add_argument("--tag", dest="tags", action="append", default=[], help="only images with this tag (repeatable)")
+    search.add_argument("--min-confidence", type=float, help="minimum confidence for --tag")
+    search.add_argument("--folder", help="only images below this folder")
+    search.add_argument("--after", dest="created_after", help="only images added at or after this date")
+    search.add_argument("--before", dest="created_before", help="only images added at or before this date")
+    for bound in ("min_width", "max_width", "min_height", "max_height"):
+        search.add_argument("--" + bound.replace("_", "-"), dest=bound, type=int)
+    search.set_defaults(handler=cmd_search)
+
+    dedup = commands.add_parser("dedup", parents=[common], help="recompute near-duplicate groups")
+    dedup.add_argument("--list", action="store_true", help="print every group")
+    dedup.set_defaults(handler=cmd_dedup)
+
+    stats = commands.add_parser("stats", parents=[common], help="library and index statistics")
+    stats.set_defaults(handler=cmd_stats)
+
+    retag = commands.add_parser("retag", parents=[common],
+                                help="recompute tags from stored embeddings (after changing labels or threshold)")
+    retag.add_argument("--chunk-size", type=int, help="embeddings per chunk (default: RETAG_CHUNK_SIZE)")
+    retag.add_argument("--progress", action="store_true", help="report progress after every chunk")
+    retag.set_defaults(handler=cmd_retag)
+
+    serve = commands.add_parser("serve", parents=[common], help="run the shared local search service")
+    serve.add_argument("--host", help="address to listen on (default: SEARCH_SERVICE_HOST)")
+    serve.add_argument("--port", type=int, help="port to listen on (default: SEARCH_SERVICE_PORT)")
+    serve.set_defaults(handler=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    config = AppConfig()
+    if args.backend:
+        config.INFERENCE_BACKEND = args.backend
+    if args.device:
+        config.DEVICE = args.device
+    if args.threads:
+        config.ONNX_INTRA_OP_THREADS = args.threads
+    if getattr(args, "workers", None):
+        config.INGEST_WORKERS = args.workers
+    if getattr(args, "batch_size", None):
+        config.BATCH_PROCESSING_SIZE = args.batch_size
+    if getattr(args, "chunk_size", None):
+        config.RETAG_CHUNK_SIZE = args.chunk_size
+    if getattr(args, "index_type", None):
+        config.FAISS_INDEX_TYPE = args.index_type
+
+    out = _Output(sys.stdout, args.json)
+    # Library code reports through print(); keep stdout for the JSON records
+    redirect = contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext()
+    with redirect:
+        embedding_store = EmbeddingStore(config.DATA_DIR, dtype=config.EMBEDDING_STORE_DTYPE)
+        db_manager = DatabaseManager(config.DATABASE_PATH, embedding_store)
+        try:
+            return args.handler(args, config, db_manager, out)
+        finally:
+            db_manager.close()
@@ -1,109 +1,596 @@
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager, ExitStack
+from datetime import date
 import numpy as np
+from .migrations import migrate
 
 class DatabaseManager:
-    def __init__(self, db_path):
+    # Applied to every pooled connection. WAL lets the GUI read while an
+    # ingestion thread writes; NORMAL sync is durable under WAL and avoids an
+    # fsync per commit.
+    PRAGMAS = (
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -65536",
+        "PRAGMA mmap_size = 268435456",
+    )
+
+    def __init__(self, db_path, embedding_store=None):
         self.db_path = db_path
+        # Optional memory-mapped copy of the embeddings table (see EmbeddingStore)
+        self.embedding_store = embedding_store
+        self._local = threading.local()
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+        # Label name -> labels.id, filled lazily; label ids never change once assigned
+        self._label_ids = {}
+        self._label_ids_lock = threading.Lock()
         self.init_database()
-    
+
+    def get_connection(self):
+        """Return this thread's pooled connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            for pragma in self.PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            self._local.depth = 0
+            self._local.on_commit = []
+            self._local.on_rollback = []
+            self._local.store_writable = None
+            with self._connections_lock:
+                self._prune_connections()
+                self._connections[threading.get_ident()] = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor on this thread's connection inside a single transaction.
+
+        Nested uses join the outermost transaction, which commits (or rolls
+        back) once when it exits.
+        """
+        conn = self.get_connection()
+        local = self._local
+        local.depth += 1
+        try:
+            yield conn.cursor()
+            if local.depth == 1:
+                conn.commit()
+                for callback in local.on_commit:
+                    callback()
+        except Exception:
+            if local.depth == 1:
+                conn.rollback()
+                # Ids cached during the failed transaction may not exist any more
+                with self._label_ids_lock:
+                    self._label_ids.clear()
+                for callback in local.on_rollback:
+                    callback()
+            raise
+        finally:
+            local.depth -= 1
+            if local.depth == 0:
+                local.on_commit = []
+                local.on_rollback = []
+                local.store_writable = None
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._connections_lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _prune_connections(self):
+        # Connections of threads that have exited can never be used again
+        alive = {thread.ident for thread in threading.enumerate()}
+        for ident in [ident for ident in self._connections if ident not in alive]:
+            self._connections.pop(ident).close()
+
     def init_database(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Images metadata
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS images (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                path TEXT UNIQUE NOT NULL,
-                filename TEXT NOT NULL,
-                size INTEGER,
-                width INTEGER,
-                height INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                processed BOOLEAN DEFAULT FALSE
-            )
-        ''')
-        
-        # Tags linked to images
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tags (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                image_id INTEGER,
-                tag TEXT NOT NULL,
-                confidence REAL DEFAULT 0.0,
-                FOREIGN KEY (image_id) REFERENCES images (id)
-            )
-        ''')
-        
-        # Embeddings stored as BLOB
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS embeddings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                image_id INTEGER UNIQUE,
-                embedding BLOB,
-                FOREIGN KEY (image_id) REFERENCES images (id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with self.transaction() as cursor:
+            applied = migrate(cursor)
+        if applied:
+            print(f"Database schema migrated to version {applied[-1]}")
 
     def add_image(self, path, filename, size, width, height):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR IGNORE INTO images (path, filename, size, width, height)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (path, filename, size, width, height))
-        conn.commit()
-        image_id = cursor.lastrowid
-        conn.close()
-        return image_id
-    
-    def add_tags(self, image_id, tags):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        for tag, confidence in tags:
+        with self.transaction() as cursor:
             cursor.execute('''
-                INSERT INTO tags (image_id, tag, confidence)
-                VALUES (?, ?, ?)
-            ''', (image_id, tag, confidence))
-        conn.commit()
-        conn.close()
-    
+                INSERT OR IGNORE INTO images (path, filename, size, width, height)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (path, filename, size, width, height))
+            # lastrowid is meaningless when the row already existed and was ignored
+            cursor.execute('SELECT id FROM images WHERE path = ?', (path,))
+            return cursor.fetchone()[0]
+
+    def add_tags(self, image_id, tags):
+        self.add_tags_many([(image_id, tags)])
+
     def add_embedding(self, image_id, embedding: np.ndarray):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        embedding_bytes = embedding.tobytes()
-        cursor.execute('''
-            INSERT OR REPLACE INTO embeddings (image_id, embedding)
-            VALUES (?, ?)
-        ''', (image_id, embedding_bytes))
-        conn.commit()
-        conn.close()
-    
+        self.add_embeddings_many([image_id], [embedding])
+
+    def add_images_many(self, images):
+        """Insert or refresh images in one transaction.
+
+        Rows are ``(path, filename, size, width, height[, phash, mtime_ns, content_hash])``;
+        omitted trailing fields keep their stored values. Returns the image ids
+        in input order.
+        """
+        rows = [tuple(image) + (None,) * (8 - len(image)) for image in images]
+        with self.transaction() as cursor:
+            cursor.executemany('''
+                INSERT INTO images (path, filename, size, width, height, phash, mtime_ns, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    filename = excluded.filename, size = excluded.size,
+                    width = excluded.width, height = excluded.height,
+                    phash = COALESCE(excluded.phash, images.phash),
+                    mtime_ns = COALESCE(excluded.mtime_ns, images.mtime_ns),
+                    content_hash = COALESCE(excluded.content_hash, images.content_hash)
+            ''', rows)
+            image_ids = []
+            for image in images:
+                cursor.execute('SELECT id FROM images WHERE path = ?', (image[0],))
+                image_ids.append(cursor.fetchone()[0])
+            return image_ids
+
+    def add_tags_many(self, image_tags):
+        """Insert tags for many images; ``image_tags`` is ``[(image_id, [(tag, confidence), ...]), ...]``"""
+        with self.transaction() as cursor:
+            label_ids = self._get_label_ids(cursor, {tag for _, tags in image_tags for tag, _ in tags})
+            rows = [(image_id, label_ids[tag], confidence)
+                    for image_id, tags in image_tags for tag, confidence in tags]
+            cursor.executemany('''
+                INSERT OR REPLACE INTO tags (image_id, tag_id, confidence)
+                VALUES (?, ?, ?)
+            ''', rows)
+
+    def replace_tags_many(self, image_ids, rows):
+        """Replace all tags of image_ids with ``(image_id, tag_id, confidence)`` rows in one transaction"""
+        with self.transaction() as cursor:
+            cursor.executemany('DELETE FROM tags WHERE image_id = ?', [(int(image_id),) for image_id in image_ids])
+            cursor.executemany('INSERT INTO tags (image_id, tag_id, confidence) VALUES (?, ?, ?)', rows)
+
+    def get_label_ids(self, names):
+        """Map tag names to labels.id, adding unseen names to the vocabulary"""
+        with self.transaction() as cursor:
+            return self._get_label_ids(cursor, names)
+
+    def add_embeddings_many(self, image_ids, embeddings):
+        """Insert or replace one float32 embedding per image id in one transaction"""
+        rows = [(image_id, np.asarray(embedding, dtype=np.float32).tobytes())
+                for image_id, embedding in zip(image_ids, embeddings)]
+        with self.transaction() as cursor:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO embeddings (image_id, embedding)
+                VALUES (?, ?)
+            ''', rows)
+            if self.embedding_store is not None and self._store_writable():
+                self.embedding_store.put(image_ids, embeddings)
+            self._bump_generation(cursor)
+
     def get_images(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
         cursor.execute('SELECT * FROM images')
-        images = cursor.fetchall()
-        conn.close()
-        return images
-    
+        return cursor.fetchall()
+
+    def count_images(self):
+        cursor = self.get_connection().cursor()
+        cursor.execute('SELECT COUNT(*) FROM images')
+        return cursor.fetchone()[0]
+
+    def get_stats(self):
+        """Row counts and the current generation, for reporting"""
+        cursor = self.get_connection().cursor()
+        cursor.execute('''
+            SELECT
+                (SELECT COUNT(*) FROM images),
+                (SELECT COUNT(*) FROM images WHERE processed),
+                (SELECT COUNT(*) FROM embeddings),
+                (SELECT COUNT(*) FROM tags),
+                (SELECT COUNT(*) FROM labels),
+                (SELECT COUNT(*) FROM (
+                    SELECT cluster_id FROM duplicates GROUP BY cluster_id HAVING COUNT(*) > 1))
+        ''')
+        names = ("images", "processed", "embeddings", "tags", "labels", "duplicate_clusters")
+        stats = dict(zip(names, cursor.fetchone()))
+        stats["generation"] = self.get_generation()
+        return stats
+
+    def get_images_after(self, after_id, limit):
+        """Keyset page: ``(id, path)`` for up to ``limit`` images with id greater than after_id"""
+        cursor = self.get_connection().cursor()
+        cursor.execute('SELECT id, path FROM images WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit))
+        return cursor.fetchall()
+
+    def get_image_details(self, image_id):
+        """Stored metadata of one image as a dict, or None if it does not exist"""
+        cursor = self.get_connection().cursor()
+        cursor.execute('SELECT id, path, filename, size, width, height, created_at FROM images WHERE id = ?',
+                       (image_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "path", "filename", "size", "width", "height", "created_at"), row))
+
+    def get_image_paths(self, image_ids):
+        """Map image ids to paths; ids that no longer exist are omitted"""
+        cursor = self.get_connection().cursor()
+        paths = {}
+        ids = list(image_ids)
+        # Stay below SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            cursor.execute(f'SELECT id, path FROM images WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+            paths.update(cursor.fetchall())
+        return paths
+
+    def get_image_id_at(self, offset):
+        """Id of the image at position ``offset`` in id order, or None"""
+        cursor = self.get_connection().cursor()
+        cursor.execute('SELECT id FROM images ORDER BY id LIMIT 1 OFFSET ?', (offset,))
+        result = cursor.fetchone()
+        return result[0] if result else None
+
     def get_tags_for_image(self, image_id):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT tag, confidence FROM tags WHERE image_id = ?', (image_id,))
-        tags = cursor.fetchall()
-        conn.close()
-        return tags
-    
+        cursor = self.get_connection().cursor()
+        cursor.execute('''
+            SELECT labels.name, tags.confidence FROM tags
+            JOIN labels ON labels.id = tags.tag_id
+            WHERE tags.image_id = ?
+            ORDER BY tags.confidence DESC
+        ''', (image_id,))
+        return cursor.fetchall()
+
+    def get_images_with_tag(self, tag, min_confidence=0.0, limit=None):
+        """Return ``(image_id, path, confidence)`` for images tagged ``tag`` at or above
+        ``min_confidence``, most confident first."""
+        cursor = self.get_connection().cursor()
+        cursor.execute('SELECT id FROM labels WHERE name = ?', (tag,))
+        result = cursor.fetchone()
+        if not result:
+            return []
+        # Range scan on idx_tags_tag_confidence, already in confidence order
+        cursor.execute('''
+            SELECT images.id, images.path, tags.confidence FROM tags
+            JOIN images ON images.id = tags.image_id
+            WHERE tags.tag_id = ? AND tags.confidence >= ?
+            ORDER BY tags.confidence DESC
+            LIMIT ?
+        ''', (result[0], min_confidence, -1 if limit is None else limit))
+        return cursor.fetchall()
+
+    def get_filtered_image_ids(self, tags=(), min_confidence=0.0, folder=None, created_after=None,
+                               created_before=None, min_width=None, max_width=None, min_height=None,
+                               max_height=None):
+        """Sorted int64 array of the ids of images matching every given predicate.
+
+        Each tag must be present at ``min_confidence`` or more (a range scan
+        on idx_tags_tag_confidence per tag); folder is a range scan on the
+        unique path index and the created_at bounds use idx_images_created_at.
+        Dimension bounds are checked on the rows those lookups select.
+        """
+        if isinstance(tags, str):
+            tags = [tags]
+        clauses, params = [], []
+        if folder:
+            prefix = os.path.join(os.path.abspath(folder), "")
+            clauses.append('path >= ? AND path < ?')
+            params.extend((prefix, prefix + "\U0010ffff"))
+        for column, operator, value in (("created_at", ">=", created_after), ("created_at", "<=", created_before),
+                                        ("width", ">=", min_width), ("width", "<=", max_width),
+                                        ("height", ">=", min_height), ("height", "<=", max_height)):
+            if value is None:
+                continue
+            value = value if isinstance(value, (int, float)) else str(value)
+            if column == "created_at" and operator == "<=" and self._is_date(value):
+                # A bare date bound includes that whole day: created_at holds
+                # 'YYYY-MM-DD HH:MM:SS', which sorts after 'YYYY-MM-DD'
+                clauses.append(f"{column} < date(?, '+1 day')")
+            else:
+                clauses.append(f'{column} {operator} ?')
+            params.append(value)
+        for tag in tags:
+            clauses.append('''id IN (SELECT image_id FROM tags
+                                     WHERE tag_id = (SELECT id FROM labels WHERE name = ?) AND confidence >= ?)''')
+            params.extend((tag, min_confidence))
+
+        cursor = self.get_connection().cursor()
+        where = f' WHERE {" AND ".join(clauses)}' if clauses else ''
+        cursor.execute(f'SELECT id FROM images{where} ORDER BY id', params)
+        return np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+
+    def get_labels(self):
+        """Return ``(label_id, name)`` for every tag name in the vocabulary"""
+        cursor = self.get_connection().cursor()
+        cursor.execute('SELECT id, name FROM labels ORDER BY name')
+        return cursor.fetchall()
+
     def get_embedding_for_image(self, image_id):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if self._store_synced():
+            return self.embedding_store.get(image_id)
+        cursor = self.get_connection().cursor()
         cursor.execute('SELECT embedding FROM embeddings WHERE image_id = ?', (image_id,))
         result = cursor.fetchone()
-        conn.close()
         if result:
             return np.frombuffer(result[0], dtype=np.float32)
         return None
+
+    def get_embeddings_for_images(self, image_ids):
+        """Return ``(found_ids, embeddings)`` for the given ids as one float32 matrix.
+
+        Ids without an embedding are skipped; the remaining order is preserved.
+        """
+        if self._store_synced():
+            store = self.embedding_store
+            with store.lock:
+                found = [int(i) for i in image_ids if int(i) in store.rows]
+                rows = [store.rows[i] for i in found]
+                embeddings = np.asarray(store.matrix[rows], dtype=np.float32) if rows else None
+        else:
+            cursor = self.get_connection().cursor()
+            blobs = {}
+            ids = [int(i) for i in image_ids]
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                cursor.execute(f'SELECT image_id, embedding FROM embeddings WHERE image_id IN ({",".join("?" * len(chunk))})',
+                               chunk)
+                blobs.update(cursor.fetchall())
+            found = [i for i in ids if i in blobs]
+            embeddings = np.vstack([np.frombuffer(blobs[i], dtype=np.float32) for i in found]) if found else None
+        if embeddings is None:
+            return [], np.empty((0, 0), dtype=np.float32)
+        return found, embeddings
+
+    def add_processed_batch(self, records):
+        """Write a batch of analysed images, their tags and embeddings in one transaction.
+
+        Each record is ``(path, filename, size, width, height, embedding, tags[, phash,
+        mtime_ns, content_hash])``.
+        Returns the image ids in record order.
+        """
+        with self.transaction() as cursor:
+            image_ids = self.add_images_many([tuple(record[:5]) + tuple(record[7:]) for record in records])
+            params = [(image_id,) for image_id in image_ids]
+            cursor.executemany('UPDATE images SET processed = TRUE WHERE id = ?', params)
+            # Re-processing an image replaces its previous tags
+            cursor.executemany('DELETE FROM tags WHERE image_id = ?', params)
+            self.add_tags_many([(image_id, record[6]) for image_id, record in zip(image_ids, records)])
+            embedded = [(image_id, record[5]) for image_id, record in zip(image_ids, records)
+                        if record[5] is not None]
+            if embedded:
+                self.add_embeddings_many([row[0] for row in embedded], [row[1] for row in embedded])
+        return image_ids
+
+    def get_all_embeddings(self):
+        """Return ``(image_ids, embeddings)`` for every stored embedding.
+
+        ``embeddings`` is an (N, D) array aligned with ``image_ids``. With an
+        embedding store attached both are zero-copy views onto its mmap (and
+        ``embeddings`` has the store's dtype); otherwise they are read from
+        SQLite as float32.
+        """
+        if self.embedding_store is not None:
+            generation = self.get_generation()
+            if not self.embedding_store.is_synced(generation):
+                # Another process may have brought the store up to date meanwhile
+                with self.embedding_store.writing():
+                    if not self.embedding_store.is_synced(generation):
+                        image_ids, embeddings = self._read_all_embeddings()
+                        self.embedding_store.rebuild(image_ids, embeddings, generation)
+            return self.embedding_store.get_all()
+        return self._read_all_embeddings()
+
+    def iter_embeddings(self, chunk_size):
+        """Yield ``(image_ids, embeddings)`` chunks of at most chunk_size rows.
+
+        Memory stays bounded by one chunk: rows come from slices of the
+        embedding store's mmap when it is in sync, otherwise from keyset
+        pages of the embeddings table. ``embeddings`` is float32.
+        """
+        if self._store_synced():
+            image_ids, embeddings = self.embedding_store.get_all()
+            for start in range(0, len(image_ids), chunk_size):
+                yield (np.array(image_ids[start:start + chunk_size]),
+                       np.array(embeddings[start:start + chunk_size], dtype=np.float32))
+            return
+
+        cursor = self.get_connection().cursor()
+        last_id = -1
+        while True:
+            cursor.execute('SELECT image_id, embedding FROM embeddings WHERE image_id > ? ORDER BY image_id LIMIT ?',
+                           (last_id, chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield (np.array([row[0] for row in rows], dtype=np.int64),
+                   np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows]))
+
+    def _read_all_embeddings(self):
+        cursor = self.get_connection().cursor()
+        cursor.execute('SELECT image_id, embedding FROM embeddings ORDER BY image_id')
+        rows = cursor.fetchall()
+        if not rows:
+            return [], np.empty((0, 0), dtype=np.float32)
+        image_ids = [row[0] for row in rows]
+        embeddings = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        return image_ids, embeddings
+
+    def delete_images(self, image_ids):
+        """Remove images together with their tags and embeddings"""
+        params = [(image_id,) for image_id in image_ids]
+        if not params:
+            return
+        with self.transaction() as cursor:
+            cursor.executemany('DELETE FROM tags WHERE image_id = ?', params)
+            cursor.executemany('DELETE FROM embeddings WHERE image_id = ?', params)
+            cursor.executemany('DELETE FROM duplicates WHERE image_id = ?', params)
+            cursor.executemany('DELETE FROM images WHERE id = ?', params)
+            if self.embedding_store is not None and self._store_writable():
+                self.embedding_store.delete(image_ids)
+            self._bump_generation(cursor)
+
+    def get_scan_state(self, folder_path):
+        """Return ``{path: (id, size, mtime_ns, content_hash, processed)}`` for images below
+        folder_path, as one range scan on the unique path index."""
+        prefix = os.path.join(folder_path, "")
+        # Every path starting with prefix sorts in [prefix, prefix + U+10FFFF)
+        cursor = self.get_connection().cursor()
+        cursor.execute('''
+            SELECT path, id, size, mtime_ns, content_hash, processed FROM images
+            WHERE path >= ? AND path < ?
+        ''', (prefix, prefix + "\U0010ffff"))
+        return {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+    def update_mtimes(self, rows):
+        """Record new mtimes, given as ``(mtime_ns, image_id)``, for files whose content is unchanged"""
+        with self.transaction() as cursor:
+            cursor.executemany('UPDATE images SET mtime_ns = ? WHERE id = ?', rows)
+
+    def get_phashes(self, image_ids):
+        """Map image ids to their perceptual hash; images without one are omitted"""
+        cursor = self.get_connection().cursor()
+        phashes = {}
+        ids = list(image_ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            cursor.execute(f'SELECT id, phash FROM images WHERE phash IS NOT NULL AND id IN ({",".join("?" * len(chunk))})',
+                           chunk)
+            phashes.update(cursor.fetchall())
+        return phashes
+
+    def get_phash_pairs(self, image_ids=None):
+        """Pairs of image ids with identical perceptual hashes.
+
+        With ``image_ids`` only pairs involving those images are returned,
+        otherwise every pair in the library; both use idx_images_phash.
+        Hashes with every bit equal (0 and -1) are skipped: any image without
+        a horizontal gradient, such as a flat colour or a dark frame, has one,
+        so they say nothing about similarity and would make the join quadratic.
+        """
+        cursor = self.get_connection().cursor()
+        if image_ids is None:
+            cursor.execute('''
+                SELECT a.id, b.id FROM images a
+                JOIN images b ON b.phash = a.phash AND b.id < a.id
+                WHERE a.phash IS NOT NULL AND a.phash NOT IN (0, -1)
+            ''')
+            return cursor.fetchall()
+        pairs = []
+        ids = list(image_ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            cursor.execute(f'''
+                SELECT a.id, b.id FROM images a
+                JOIN images b ON b.phash = a.phash AND b.id != a.id
+                WHERE a.phash IS NOT NULL AND a.phash NOT IN (0, -1) AND a.id IN ({",".join("?" * len(chunk))})
+            ''', chunk)
+            pairs.extend(cursor.fetchall())
+        return pairs
+
+    def get_duplicate_clusters(self):
+        """Return every duplicate cluster with more than one member, as lists of image ids"""
+        cursor = self.get_connection().cursor()
+        cursor.execute('''
+            SELECT cluster_id, image_id FROM duplicates
+            WHERE cluster_id IN (SELECT cluster_id FROM duplicates GROUP BY cluster_id HAVING COUNT(*) > 1)
+            ORDER BY cluster_id, image_id
+        ''')
+        clusters = {}
+        for cluster_id, image_id in cursor.fetchall():
+            clusters.setdefault(cluster_id, []).append(image_id)
+        return list(clusters.values())
+
+    def get_duplicate_clusters_for_images(self, image_ids):
+        """Return ``{cluster_id: [member ids]}`` for every cluster containing one of image_ids"""
+        cursor = self.get_connection().cursor()
+        clusters = {}
+        ids = list(image_ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            cursor.execute(f'''
+                SELECT cluster_id, image_id FROM duplicates WHERE cluster_id IN (
+                    SELECT cluster_id FROM duplicates WHERE image_id IN ({",".join("?" * len(chunk))})
+                )
+            ''', chunk)
+            for cluster_id, image_id in cursor.fetchall():
+                clusters.setdefault(cluster_id, set()).add(image_id)
+        return {cluster_id: sorted(members) for cluster_id, members in clusters.items()}
+
+    def save_duplicate_clusters(self, clusters, replace_all=False):
+        """Store ``[[image ids], ...]`` clusters; each is keyed by its smallest image id.
+
+        Members already in another cluster are moved. ``replace_all`` clears
+        previous clusters first, for a full recomputation.
+        """
+        rows = [(image_id, min(members)) for members in clusters for image_id in members]
+        with self.transaction() as cursor:
+            if replace_all:
+                cursor.execute('DELETE FROM duplicates')
+            cursor.executemany('INSERT OR REPLACE INTO duplicates (image_id, cluster_id) VALUES (?, ?)', rows)
+
+    def get_generation(self):
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT value FROM meta WHERE key = 'generation'")
+        result = cursor.fetchone()
+        return result[0] if result else 0
+
+    def _bump_generation(self, cursor):
+        cursor.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+
+    def _get_label_ids(self, cursor, names):
+        """Map tag names to labels.id, adding unseen names to the vocabulary"""
+        with self._label_ids_lock:
+            missing = [name for name in names if name not in self._label_ids]
+        if missing:
+            cursor.executemany('INSERT OR IGNORE INTO labels (name) VALUES (?)', [(name,) for name in missing])
+            found = {}
+            for name in missing:
+                cursor.execute('SELECT id FROM labels WHERE name = ?', (name,))
+                found[name] = cursor.fetchone()[0]
+            with self._label_ids_lock:
+                self._label_ids.update(found)
+        with self._label_ids_lock:
+            return {name: self._label_ids[name] for name in names}
+
+    @staticmethod
+    def _is_date(value):
+        try:
+            return len(value) == 10 and date.fromisoformat(value) is not None
+        except ValueError:
+            return False
+
+    def _store_synced(self):
+        return self.embedding_store is not None and self.embedding_store.is_synced(self.get_generation())
+
+    def _store_writable(self):
+        """Whether embedding writes in the current transaction should go to the store too.
+
+        Decided once per transaction, before its first generation bump: only a
+        store that is in sync with SQLite is kept up to date incrementally; a
+        stale one is rebuilt on the next get_all_embeddings instead. The store
+        is flushed at the new generation on commit and invalidated on rollback.
+
+        Call it only after the transaction's first SQL write. The store's
+        inter-process lock is then taken while holding SQLite's write lock and
+        kept until the transaction ends, so store and database change together
+        and every process takes the two locks in the same order.
+        """
+        local = self._local
+        if local.store_writable is None:
+            store_lock = ExitStack()
+            store_lock.enter_context(self.embedding_store.writing())
+            local.store_writable = self._store_synced()
+            if local.store_writable:
+                local.on_commit.append(lambda: self.embedding_store.flush(self.get_generation()))
+                local.on_rollback.append(self.embedding_store.invalidate)
+            local.on_commit.append(store_lock.close)
+            local.on_rollback.append(store_lock.close)
+        return local.store_writable
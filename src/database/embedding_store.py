@@ -0,0 +1,246 @@
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class EmbeddingStore:
+    """Contiguous, memory-mapped embedding matrix with an image-id-to-row map.
+
+    Rows live in ``<name>.npy`` (float16 or float32), their image ids in
+    ``<name>_ids.npy`` and the row count, dimension and database generation
+    in ``<name>.json``. Live rows are always ``[0, count)``: deletes move the
+    last row into the hole, so readers can take a single slice of the mmap.
+
+    Several processes (GUI, CLI, search service) may share one store. Writes
+    and rebuilds happen inside ``writing()``, which holds an exclusive lock on
+    ``<name>.lock`` and first picks up whatever another process left on disk.
+    The metadata records the files' capacity and a token that changes whenever
+    they are replaced, so metadata that does not describe the files next to it
+    is treated as out of sync.
+    """
+
+    def __init__(self, directory, name="embeddings", dtype="float16"):
+        self.matrix_path = os.path.join(directory, f"{name}.npy")
+        self.ids_path = os.path.join(directory, f"{name}_ids.npy")
+        self.meta_path = os.path.join(directory, f"{name}.json")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        self.count = 0
+        self.generation = None
+        self.matrix = None
+        self.ids = None
+        self.rows = {}
+        # Token of the files currently mapped; a new one is drawn whenever they are replaced
+        self.token = None
+        # The metadata as last read or written by this process
+        self.meta = None
+        self.lock = threading.RLock()
+        self.write_lock = threading.RLock()
+        self._write_depth = 0
+        self._lock_file = None
+        self._open()
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _open(self):
+        with self.lock:
+            self.matrix = self.ids = self.dim = self.generation = self.token = None
+            self.count = 0
+            self.rows = {}
+            self.meta = meta = self._read_meta()
+            if meta is None or not (os.path.exists(self.matrix_path) and os.path.exists(self.ids_path)):
+                return
+            try:
+                matrix = np.load(self.matrix_path, mmap_mode="r+")
+                ids = np.load(self.ids_path, mmap_mode="r+")
+            except Exception as e:
+                print(f"Error opening embedding store: {e}")
+                return
+            if matrix.dtype != self.dtype:
+                # Changing EMBEDDING_STORE_DTYPE invalidates the store; it is rebuilt from SQLite
+                return
+            capacity = meta.get("capacity")
+            if (matrix.shape != (capacity, meta.get("dim")) or ids.shape != (capacity,)
+                    or not 0 <= meta.get("count", -1) <= capacity):
+                # Written by another process around these files' replacement
+                return
+            self.matrix = matrix
+            self.ids = ids
+            self.dim = meta["dim"]
+            self.count = meta["count"]
+            self.generation = meta.get("generation")
+            self.token = meta.get("token")
+            self.rows = {int(image_id): row for row, image_id in enumerate(ids[:self.count])}
+
+    @contextmanager
+    def writing(self):
+        """Hold the store's inter-process write lock, starting from the state on disk.
+
+        Reentrant within this process. Every put, delete, rebuild and flush
+        should happen inside it, so no other process replaces the files or
+        rewrites the metadata in between.
+        """
+        with self.write_lock:
+            if self._write_depth == 0:
+                self._acquire_file_lock()
+                try:
+                    if self._read_meta() != self.meta:
+                        # Another process wrote, rebuilt or invalidated the store
+                        self._open()
+                except Exception:
+                    self._release_file_lock()
+                    raise
+            self._write_depth += 1
+            try:
+                yield self
+            finally:
+                self._write_depth -= 1
+                if self._write_depth == 0:
+                    self._release_file_lock()
+
+    def _acquire_file_lock(self):
+        self._lock_file = open(self.lock_path, "a+b")
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._lock_file.seek(0)
+            msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _release_file_lock(self):
+        lock_file, self._lock_file = self._lock_file, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            lock_file.close()
+
+    def is_synced(self, generation):
+        return self.matrix is not None and self.generation == generation
+
+    def get_all(self):
+        """Return ``(image_ids, embeddings)`` as views onto the mmap, without copying"""
+        with self.lock:
+            if self.matrix is None:
+                return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=self.dtype)
+            return self.ids[:self.count], self.matrix[:self.count]
+
+    def get(self, image_id):
+        with self.lock:
+            row = self.rows.get(int(image_id))
+            if row is None:
+                return None
+            return np.asarray(self.matrix[row], dtype=np.float32)
+
+    def put(self, image_ids, embeddings):
+        """Append new rows or overwrite the rows of ids already in the store"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(embeddings) == 0:
+            return
+        with self.writing(), self.lock:
+            if self.matrix is None or self.dim != embeddings.shape[1]:
+                self._allocate(embeddings.shape[1], max(1024, len(embeddings)))
+            new_ids = [int(i) for i in image_ids if int(i) not in self.rows]
+            self._reserve(self.count + len(new_ids))
+            for image_id in new_ids:
+                self.rows[image_id] = self.count
+                self.ids[self.count] = image_id
+                self.count += 1
+            rows = [self.rows[int(i)] for i in image_ids]
+            self.matrix[rows] = embeddings.astype(self.dtype)
+
+    def delete(self, image_ids):
+        with self.writing(), self.lock:
+            for image_id in image_ids:
+                row = self.rows.pop(int(image_id), None)
+                if row is None:
+                    continue
+                last = self.count - 1
+                if row != last:
+                    moved_id = int(self.ids[last])
+                    self.matrix[row] = self.matrix[last]
+                    self.ids[row] = moved_id
+                    self.rows[moved_id] = row
+                self.count -= 1
+
+    def rebuild(self, image_ids, embeddings, generation):
+        """Replace the whole store, e.g. from the SQLite embeddings table"""
+        with self.writing(), self.lock:
+            self.matrix = None
+            self.rows = {}
+            self.count = 0
+            if len(embeddings):
+                self._allocate(embeddings.shape[1], len(embeddings))
+                self.put(image_ids, embeddings)
+            self.flush(generation)
+
+    def flush(self, generation):
+        """Persist rows and record the database generation they reflect"""
+        with self.writing(), self.lock:
+            if self.matrix is None:
+                return
+            self.matrix.flush()
+            self.ids.flush()
+            self.generation = generation
+            meta = {"dim": self.dim, "count": self.count, "capacity": self.matrix.shape[0],
+                    "dtype": self.dtype.name, "generation": generation, "token": self.token}
+            tmp_path = self.meta_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, self.meta_path)
+            self.meta = meta
+
+    def invalidate(self):
+        """Mark the store as out of sync so it is rebuilt on next use"""
+        with self.writing(), self.lock:
+            self.generation = None
+            if os.path.exists(self.meta_path):
+                os.remove(self.meta_path)
+            self.meta = None
+
+    def _allocate(self, dim, capacity):
+        self.dim = dim
+        self.token = uuid.uuid4().hex
+        self.matrix = self._create(self.matrix_path, (capacity, dim), self.dtype, None)
+        self.ids = self._create(self.ids_path, (capacity,), np.int64, None)
+        self.count = 0
+        self.rows = {}
+
+    def _reserve(self, needed):
+        capacity = self.matrix.shape[0]
+        if needed <= capacity:
+            return
+        # Grow geometrically so appends stay amortised O(1)
+        while capacity < needed:
+            capacity *= 2
+        self.token = uuid.uuid4().hex
+        self.matrix = self._create(self.matrix_path, (capacity, self.dim), self.dtype, self.matrix[:self.count])
+        self.ids = self._create(self.ids_path, (capacity,), np.int64, self.ids[:self.count])
+
+    @staticmethod
+    def _create(path, shape, dtype, existing):
+        tmp_path = path + ".tmp"
+        array = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+        if existing is not None:
+            array[:len(existing)] = existing
+        array.flush()
+        del array
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode="r+")
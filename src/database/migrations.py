@@ -0,0 +1,143 @@
+"""
+Schema migrations for the gallery database.
+
+The applied schema version is tracked in ``PRAGMA user_version``. Each
+migration runs once, in order, inside the caller's transaction; append new
+ones to MIGRATIONS rather than editing released ones.
+"""
+
+
+def _initial_schema(cursor):
+    # Images metadata
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT UNIQUE NOT NULL,
+            filename TEXT NOT NULL,
+            size INTEGER,
+            width INTEGER,
+            height INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            processed BOOLEAN DEFAULT FALSE
+        )
+    ''')
+
+    # Tags linked to images
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            image_id INTEGER,
+            tag TEXT NOT NULL,
+            confidence REAL DEFAULT 0.0,
+            FOREIGN KEY (image_id) REFERENCES images (id)
+        )
+    ''')
+
+    # Embeddings stored as BLOB
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS embeddings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            image_id INTEGER UNIQUE,
+            embedding BLOB,
+            FOREIGN KEY (image_id) REFERENCES images (id)
+        )
+    ''')
+
+    # Monotonic counter bumped on every embedding change, used to validate
+    # persisted search indexes against the database
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)")
+
+
+def _normalize_tags(cursor):
+    # Tag names move into a dictionary table; tags keeps integer ids only
+    cursor.execute('''
+        CREATE TABLE labels (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT INTO labels (name) SELECT DISTINCT tag FROM tags ORDER BY tag')
+
+    # Clustered on (image_id, tag_id), so per-image lookups read one contiguous range
+    cursor.execute('''
+        CREATE TABLE tags_v2 (
+            image_id INTEGER NOT NULL,
+            tag_id INTEGER NOT NULL,
+            confidence REAL DEFAULT 0.0,
+            PRIMARY KEY (image_id, tag_id),
+            FOREIGN KEY (image_id) REFERENCES images (id),
+            FOREIGN KEY (tag_id) REFERENCES labels (id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        INSERT INTO tags_v2 (image_id, tag_id, confidence)
+        SELECT tags.image_id, labels.id, MAX(tags.confidence)
+        FROM tags JOIN labels ON labels.name = tags.tag
+        WHERE tags.image_id IS NOT NULL
+        GROUP BY tags.image_id, labels.id
+    ''')
+    cursor.execute('DROP TABLE tags')
+    cursor.execute('ALTER TABLE tags_v2 RENAME TO tags')
+
+    # Covers "images with tag X above confidence Y": secondary indexes on a
+    # WITHOUT ROWID table carry the primary key, so image_id comes for free
+    cursor.execute('CREATE INDEX idx_tags_tag_confidence ON tags (tag_id, confidence DESC)')
+
+
+def _duplicate_clusters(cursor):
+    # Perceptual hash computed during ingestion; exact matches are found via the index
+    cursor.execute('ALTER TABLE images ADD COLUMN phash INTEGER')
+    cursor.execute('CREATE INDEX idx_images_phash ON images (phash)')
+
+    # Near-duplicate clusters; cluster_id is the smallest image id in the cluster
+    cursor.execute('''
+        CREATE TABLE duplicates (
+            image_id INTEGER PRIMARY KEY,
+            cluster_id INTEGER NOT NULL,
+            FOREIGN KEY (image_id) REFERENCES images (id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_duplicates_cluster ON duplicates (cluster_id)')
+
+
+def _file_state(cursor):
+    # Lets a rescan skip files whose size/mtime (or, failing that, content) is unchanged
+    cursor.execute('ALTER TABLE images ADD COLUMN mtime_ns INTEGER')
+    cursor.execute('ALTER TABLE images ADD COLUMN content_hash TEXT')
+
+
+def _created_at_index(cursor):
+    # Date-range predicates of filtered search
+    cursor.execute('CREATE INDEX idx_images_created_at ON images (created_at)')
+
+
+# (version, migration) pairs, applied in order
+MIGRATIONS = [
+    (1, _initial_schema),
+    (2, _normalize_tags),
+    (3, _duplicate_clusters),
+    (4, _file_state),
+    (5, _created_at_index),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(cursor):
+    """Bring the schema up to SCHEMA_VERSION; returns the versions applied"""
+    cursor.execute('PRAGMA user_version')
+    current = cursor.fetchone()[0]
+    applied = []
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        migration(cursor)
+        cursor.execute(f'PRAGMA user_version = {version}')
+        applied.append(version)
+    return applied
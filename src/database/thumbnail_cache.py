@@ -0,0 +1,69 @@
+import hashlib
+import os
+from PIL import Image
+
+
+class ThumbnailCache:
+    """Content-addressed on-disk thumbnail cache.
+
+    Thumbnails are keyed by absolute path, mtime and file size, so an edited
+    or replaced original gets a fresh entry without explicit invalidation.
+    Files are sharded into ``<cache_dir>/<key[:2]>/<key>.<ext>``.
+    """
+
+    def __init__(self, cache_dir, size, image_format="JPEG", quality=85):
+        self.cache_dir = str(cache_dir)
+        self.size = tuple(size)
+        self.image_format = image_format.upper()
+        self.quality = quality
+        self.extension = ".webp" if self.image_format == "WEBP" else ".jpg"
+
+    def key(self, image_path, stat=None):
+        stat = stat or os.stat(image_path)
+        source = f"{os.path.abspath(image_path)}\0{stat.st_mtime_ns}\0{stat.st_size}"
+        return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+    def path_for_key(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + self.extension)
+
+    def get(self, image_path):
+        """Return the cached thumbnail path, or None if it has not been generated"""
+        try:
+            path = self.path_for_key(self.key(image_path))
+        except OSError:
+            return None
+        return path if os.path.exists(path) else None
+
+    def get_or_create(self, image_path):
+        """Return the cached thumbnail path, generating it first if needed"""
+        try:
+            stat = os.stat(image_path)
+            path = self.path_for_key(self.key(image_path, stat))
+            if os.path.exists(path):
+                return path
+            with Image.open(image_path) as img:
+                return self.create_from_image(image_path, img, stat)
+        except Exception as e:
+            print(f"Error creating thumbnail for {image_path}: {e}")
+            return None
+
+    def create_from_image(self, image_path, img, stat=None):
+        """Write a thumbnail for image_path from an already opened image.
+
+        Ingestion calls this with the image it decoded for the model, so the
+        original is only read once.
+        """
+        path = self.path_for_key(self.key(image_path, stat))
+        if os.path.exists(path):
+            return path
+        # JPEG draft mode decodes at the smallest 1/2..1/8 scale that is still
+        # at least the thumbnail size; a no-op for other formats or decoded images
+        img.draft("RGB", self.size)
+        thumb = img.convert("RGB")
+        thumb.thumbnail(self.size, Image.Resampling.LANCZOS)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        thumb.save(tmp_path, format=self.image_format, quality=self.quality)
+        os.replace(tmp_path, path)
+        return path
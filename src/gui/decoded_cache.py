@@ -0,0 +1,47 @@
+import threading
+from collections import OrderedDict
+
+
+class DecodedImageCache:
+    """Thread-safe LRU of decoded PIL images, bounded by their pixel memory.
+
+    Keyed by ``(image_path, size)`` so one original can be cached at several
+    display sizes. Shared by every viewer window; decode workers fill it
+    while the Tk thread reads it.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _image_bytes(image):
+        return image.width * image.height * len(image.getbands())
+
+    def get(self, image_path, size):
+        key = (image_path, tuple(size))
+        with self.lock:
+            image = self.images.get(key)
+            if image is not None:
+                self.images.move_to_end(key)
+            return image
+
+    def __contains__(self, key):
+        image_path, size = key
+        with self.lock:
+            return (image_path, tuple(size)) in self.images
+
+    def put(self, image_path, size, image):
+        key = (image_path, tuple(size))
+        with self.lock:
+            previous = self.images.pop(key, None)
+            if previous is not None:
+                self.bytes -= self._image_bytes(previous)
+            self.images[key] = image
+            self.bytes += self._image_bytes(image)
+            while self.bytes > self.max_bytes and len(self.images) > 1:
+                _, evicted = self.images.popitem(last=False)
+                self.bytes -= self._image_bytes(evicted)
+        return image
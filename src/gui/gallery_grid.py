@@ -0,0 +1,234 @@
+import tkinter as tk
+from tkinter import ttk
+from collections import OrderedDict
+import os
+from PIL import Image
+
+
+class DatabaseRowSource:
+    """All images in the library, fetched page by page with keyset pagination.
+
+    Only a bounded number of pages is kept in memory. Sequential scrolling
+    continues from the last id of the neighbouring page (``WHERE id > ?``);
+    jumps resolve the page's first id with one OFFSET lookup on the primary key.
+    """
+
+    def __init__(self, db_manager, page_size, max_pages=64):
+        self.db_manager = db_manager
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.pages = OrderedDict()
+        self._count = db_manager.count_images()
+
+    def __len__(self):
+        return self._count
+
+    def get(self, index):
+        """Return ``(image_id, path)`` for the row at index"""
+        page_number, offset = divmod(index, self.page_size)
+        page = self._page(page_number)
+        return page[offset] if offset < len(page) else None
+
+    def _page(self, page_number):
+        page = self.pages.get(page_number)
+        if page is not None:
+            self.pages.move_to_end(page_number)
+            return page
+
+        previous = self.pages.get(page_number - 1)
+        if previous and len(previous) == self.page_size:
+            page = self.db_manager.get_images_after(previous[-1][0], self.page_size)
+        else:
+            first_id = self.db_manager.get_image_id_at(page_number * self.page_size)
+            page = [] if first_id is None else self.db_manager.get_images_after(first_id - 1, self.page_size)
+
+        self.pages[page_number] = page
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+        return page
+
+
+class ListRowSource:
+    """A fixed, already materialised list of ``(image_id, path)`` rows, e.g. search results"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, index):
+        return self.rows[index] if index < len(self.rows) else None
+
+
+class _Tile:
+    def __init__(self, canvas, width, height):
+        self.frame = ttk.Frame(canvas, relief=tk.RAISED, borderwidth=2, width=width, height=height)
+        self.frame.pack_propagate(False)
+        self.image_label = ttk.Label(self.frame, anchor=tk.CENTER)
+        self.image_label.pack(pady=5, expand=True)
+        self.caption = ttk.Label(self.frame, font=("Arial", 8))
+        self.caption.pack()
+        self.window = canvas.create_window(0, 0, window=self.frame, anchor="nw", state="hidden")
+        self.index = None
+        self.image_path = None
+
+
+class GalleryGrid:
+    """Virtualized thumbnail grid drawn on an existing Canvas.
+
+    Only the tiles for the visible rows (plus one row of slack) exist; they
+    are repositioned and re-bound to new rows as the canvas scrolls, so memory
+    and redraw cost do not depend on how many images the source holds.
+    Thumbnails load on a background executor while tiles show a placeholder.
+    """
+
+    PADDING = 10
+    CAPTION_HEIGHT = 30
+
+    def __init__(self, canvas, scrollbar, config, thumbnail_cache, photo_cache, executor, on_open=None):
+        self.canvas = canvas
+        self.scrollbar = scrollbar
+        self.config = config
+        self.thumbnail_cache = thumbnail_cache
+        self.photo_cache = photo_cache
+        self.executor = executor
+        self.on_open = on_open
+        self.columns = max(1, config.GRID_COLUMNS)
+        self.tile_width = config.THUMBNAIL_SIZE[0] + self.PADDING
+        self.tile_height = config.THUMBNAIL_SIZE[1] + self.PADDING + self.CAPTION_HEIGHT
+        self.source = ListRowSource([])
+        self.tiles = []
+        self.empty_text = None
+        self._refresh_pending = False
+
+        self.canvas.configure(yscrollcommand=self._on_scroll, yscrollincrement=self.tile_height // 4)
+        self.canvas.bind("<Configure>", lambda e: self.schedule_refresh())
+        self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind_all("<Button-4>", lambda e: self._scroll_units(-1))
+        self.canvas.bind_all("<Button-5>", lambda e: self._scroll_units(1))
+
+    def set_source(self, source, empty_message="No images found. Add a folder to get started."):
+        self.source = source
+        rows = -(-len(source) // self.columns)
+        height = rows * (self.tile_height + self.PADDING)
+        self.canvas.configure(scrollregion=(0, 0, self.columns * (self.tile_width + self.PADDING), height))
+        self.canvas.yview_moveto(0)
+
+        if self.empty_text is not None:
+            self.canvas.delete(self.empty_text)
+            self.empty_text = None
+        if len(source) == 0:
+            self.empty_text = self.canvas.create_text(
+                20, 50, text=empty_message, anchor="nw", font=("Arial", 16))
+        for tile in self.tiles:
+            tile.index = None
+        self.refresh()
+
+    def schedule_refresh(self):
+        # Coalesce bursts of scroll/configure events into one layout pass
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.canvas.after_idle(self.refresh)
+
+    def refresh(self):
+        self._refresh_pending = False
+        row_height = self.tile_height + self.PADDING
+        top = self.canvas.canvasy(0)
+        visible_height = max(self.canvas.winfo_height(), row_height)
+        first_row = max(0, int(top // row_height))
+        last_row = int((top + visible_height) // row_height) + 1
+
+        first_index = first_row * self.columns
+        last_index = min(len(self.source), (last_row + 1) * self.columns)
+        self._ensure_tiles(self.columns * (last_row - first_row + 1))
+
+        # Tiles whose row is still visible keep their content; the rest are recycled
+        wanted = set(range(first_index, last_index))
+        free = [tile for tile in self.tiles if tile.index not in wanted]
+        shown = {tile.index for tile in self.tiles if tile.index in wanted}
+        for index in range(first_index, last_index):
+            if index not in shown:
+                self._bind_tile(free.pop(), index)
+        for tile in free:
+            tile.index = None
+            tile.image_path = None
+            self.canvas.itemconfigure(tile.window, state="hidden")
+
+    def _ensure_tiles(self, count):
+        while len(self.tiles) < count:
+            tile = _Tile(self.canvas, self.tile_width, self.tile_height)
+            tile.image_label.bind("<Button-1>", lambda e, t=tile: self._open(t))
+            self.tiles.append(tile)
+
+    def _bind_tile(self, tile, index):
+        row = self.source.get(index)
+        tile.index = index
+        row_number, column = divmod(index, self.columns)
+        x = self.PADDING // 2 + column * (self.tile_width + self.PADDING)
+        y = self.PADDING // 2 + row_number * (self.tile_height + self.PADDING)
+        self.canvas.coords(tile.window, x, y)
+        self.canvas.itemconfigure(tile.window, state="normal")
+
+        if row is None:
+            tile.image_path = None
+            tile.image_label.configure(image="", text="")
+            tile.caption.configure(text="")
+            return
+
+        image_path = row[1]
+        tile.image_path = image_path
+        filename = os.path.basename(image_path)
+        if len(filename) > 25:
+            filename = filename[:22] + "..."
+        tile.caption.configure(text=filename)
+
+        photo = self.photo_cache.get(image_path)
+        if photo is not None:
+            tile.image_label.configure(image=photo, text="")
+            tile.image_label.image = photo  # keep reference
+        else:
+            tile.image_label.configure(image="", text="Loading...")
+            tile.image_label.image = None
+            self.executor.submit(self._load_thumbnail, tile, image_path)
+
+    def _load_thumbnail(self, tile, image_path):
+        # Worker thread: read (or generate) the cached thumbnail; only the
+        # PhotoImage conversion has to happen on the Tk thread
+        if tile.image_path != image_path:
+            return  # scrolled away before the load started
+        try:
+            thumb_path = self.thumbnail_cache.get_or_create(image_path)
+            if thumb_path is None:
+                raise OSError("thumbnail unavailable")
+            with Image.open(thumb_path) as img:
+                img.load()
+        except Exception:
+            self.canvas.after(0, self._show_error, tile, image_path)
+            return
+        self.canvas.after(0, self._show_thumbnail, tile, image_path, img)
+
+    def _show_thumbnail(self, tile, image_path, img):
+        photo = self.photo_cache.put(image_path, img)
+        # The tile may have been recycled for another image meanwhile
+        if tile.image_path == image_path:
+            tile.image_label.configure(image=photo, text="")
+            tile.image_label.image = photo  # keep reference
+
+    def _show_error(self, tile, image_path):
+        if tile.image_path == image_path:
+            tile.image_label.configure(image="", text="Error loading image")
+
+    def _open(self, tile):
+        if self.on_open and tile.index is not None and tile.image_path:
+            self.on_open(tile.index)
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.schedule_refresh()
+
+    def _on_mousewheel(self, event):
+        self._scroll_units(-1 if event.delta > 0 else 1)
+
+    def _scroll_units(self, units):
+        self.canvas.yview_scroll(units, "units")
@@ -2,77 +2,180 @@ import tkinter as tk
 from tkinter import ttk
 from PIL import Image, ImageTk
 import os
-import sqlite3
+
+
+# Preview decodes use the coarsest JPEG DCT scale that still covers this
+# fraction of the display size
+_PREVIEW_FRACTION = 4
+
+
+def decode_for_display(image_path, size, preview=False):
+    """Decode an image and fit it into size.
+
+    For JPEGs, draft mode decodes at a reduced DCT scale: a coarse one for
+    a quick preview, or the smallest one that still covers size (which is
+    what Image.thumbnail does anyway) for the final image.
+    """
+    with Image.open(image_path) as img:
+        if preview:
+            img.draft("RGB", (size[0] // _PREVIEW_FRACTION, size[1] // _PREVIEW_FRACTION))
+        else:
+            img.draft("RGB", size)
+        img = img.convert("RGB")
+    if preview:
+        # Scale up too, so the preview occupies the final image's space
+        scale = min(size[0] / img.width, size[1] / img.height)
+        return img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.Resampling.BILINEAR)
+    img.thumbnail(size, Image.Resampling.LANCZOS)
+    return img
 
 
 class ImageViewer(tk.Toplevel):
-    def __init__(self, parent, image_path, db_path):
+    """Shows one image of a result set with its stored metadata and tags.
+
+    Images decode on a background executor: a coarse JPEG draft appears
+    first and is replaced by the full-quality image. Previous/next (buttons
+    or arrow keys) move through ``source``, the grid's row source, and the
+    neighbours within VIEWER_PREFETCH are decoded ahead into the shared
+    DecodedImageCache, so flipping through images does not wait on decoding.
+    """
+
+    def __init__(self, parent, db_manager, source, index, decoded_cache, executor, config):
         super().__init__(parent)
-        self.title(f"Image Details - {os.path.basename(image_path)}")
         self.geometry("800x600")
-        self.image_path = image_path
-        self.db_path = db_path
+        self.db_manager = db_manager
+        self.source = source
+        self.decoded_cache = decoded_cache
+        self.executor = executor
+        self.display_size = tuple(config.VIEWER_IMAGE_SIZE)
+        self.prefetch = config.VIEWER_PREFETCH
+        self.index = None
+        self.image_path = None
+        self.photo = None
         self.setup_ui()
+        self.bind("<Left>", lambda e: self.show(self.index - 1))
+        self.bind("<Right>", lambda e: self.show(self.index + 1))
+        self.show(index)
 
     def setup_ui(self):
         main_frame = ttk.Frame(self)
         main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-        # Left: Image display
+        # Left: Image display and navigation
         img_frame = ttk.Frame(main_frame)
         img_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        try:
-            img = Image.open(self.image_path)
-            img.thumbnail((500, 400), Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(img)
+        self.image_label = ttk.Label(img_frame, anchor=tk.CENTER)
+        self.image_label.pack(pady=10, expand=True)
 
-            img_label = ttk.Label(img_frame, image=photo)
-            img_label.image = photo  # keep reference to avoid GC
-            img_label.pack(pady=10)
-        except Exception as e:
-            ttk.Label(img_frame, text=f"Error loading image: {e}").pack(pady=20)
+        nav_frame = ttk.Frame(img_frame)
+        nav_frame.pack(side=tk.BOTTOM, pady=(0, 5))
+        self.prev_button = ttk.Button(nav_frame, text="< Previous", command=lambda: self.show(self.index - 1))
+        self.prev_button.pack(side=tk.LEFT)
+        self.position_var = tk.StringVar()
+        ttk.Label(nav_frame, textvariable=self.position_var, width=14, anchor=tk.CENTER).pack(side=tk.LEFT, padx=10)
+        self.next_button = ttk.Button(nav_frame, text="Next >", command=lambda: self.show(self.index + 1))
+        self.next_button.pack(side=tk.LEFT)
 
         # Right: Metadata and AI-generated tags
         info_frame = ttk.Frame(main_frame)
         info_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=(10, 0))
 
         ttk.Label(info_frame, text="Image Information", font=("Arial", 12, "bold")).pack(anchor=tk.W, pady=(0, 10))
+        self.info_label = ttk.Label(info_frame, justify=tk.LEFT, wraplength=260)
+        self.info_label.pack(anchor=tk.W, pady=(0, 10))
 
-        info_text = f"Path: {self.image_path}\nFilename: {os.path.basename(self.image_path)}\n"
-        try:
-            stat = os.stat(self.image_path)
-            size_mb = stat.st_size / (1024 * 1024)
-            info_text += f"Size: {size_mb:.2f} MB\n"
+        ttk.Label(info_frame, text="AI Generated Tags", font=("Arial", 12, "bold")).pack(anchor=tk.W, pady=(10, 5))
+        self.tags_label = ttk.Label(info_frame, justify=tk.LEFT)
+        self.tags_label.pack(anchor=tk.W)
 
-            img = Image.open(self.image_path)
-            info_text += f"Dimensions: {img.size[0]} x {img.size[1]}\nFormat: {img.format}\n"
-        except Exception:
-            pass
+    def show(self, index):
+        if self.index is not None and not 0 <= index < len(self.source):
+            return
+        row = self.source.get(index)
+        if row is None:
+            return
+        image_id, image_path = row[0], row[1]
+        self.index = index
+        self.image_path = image_path
+        self.title(f"Image Details - {os.path.basename(image_path)}")
+        self.position_var.set(f"{index + 1} / {len(self.source)}")
+        self.prev_button.state(["!disabled"] if index > 0 else ["disabled"])
+        self.next_button.state(["!disabled"] if index + 1 < len(self.source) else ["disabled"])
+        self.show_details(image_id, image_path)
 
-        info_label = ttk.Label(info_frame, text=info_text, justify=tk.LEFT)
-        info_label.pack(anchor=tk.W, pady=(0, 10))
+        image = self.decoded_cache.get(image_path, self.display_size)
+        if image is not None:
+            self._display(image_path, image)
+        else:
+            self.image_label.configure(image="", text="Loading...")
+            self.executor.submit(self._decode, image_path)
+        self._prefetch_neighbours()
 
-        ttk.Label(info_frame, text="AI Generated Tags", font=("Arial", 12, "bold")).pack(anchor=tk.W, pady=(10, 5))
+    def show_details(self, image_id, image_path):
+        """Fill the information panel from the images and tags tables, without opening the file"""
+        details = self.db_manager.get_image_details(image_id) or {"path": image_path}
+        info_text = f"Path: {details['path']}\nFilename: {os.path.basename(details['path'])}\n"
+        if details.get("size") is not None:
+            info_text += f"Size: {details['size'] / (1024 * 1024):.2f} MB\n"
+        if details.get("width") and details.get("height"):
+            info_text += f"Dimensions: {details['width']} x {details['height']}\n"
+        extension = os.path.splitext(details["path"])[1].lstrip(".").upper()
+        if extension:
+            info_text += f"Format: {'JPEG' if extension == 'JPG' else extension}\n"
+        if details.get("created_at"):
+            info_text += f"Added: {details['created_at']}\n"
+        self.info_label.configure(text=info_text)
 
-        tags = self.get_tags(self.image_path)
+        tags = self.db_manager.get_tags_for_image(image_id)
         tags_text = "\n".join([f"• {tag} ({conf:.3f})" for tag, conf in tags]) if tags else "No tags generated"
+        self.tags_label.configure(text=tags_text)
+
+    def _decode(self, image_path):
+        # Worker thread: preview first, then the final image, unless the
+        # viewer has moved on in the meantime
+        try:
+            if image_path != self.image_path:
+                return
+            if os.path.splitext(image_path)[1].lower() in (".jpg", ".jpeg"):
+                preview = decode_for_display(image_path, self.display_size, preview=True)
+                if image_path != self.image_path:
+                    return
+                self.after(0, self._display, image_path, preview)
+            image = self.decoded_cache.put(image_path, self.display_size,
+                                           decode_for_display(image_path, self.display_size))
+        except Exception as e:
+            self.after(0, self._show_error, image_path, e)
+            return
+        self.after(0, self._display, image_path, image)
+
+    def _prefetch_neighbours(self):
+        for distance in range(1, self.prefetch + 1):
+            for index in (self.index + distance, self.index - distance):
+                if 0 <= index < len(self.source):
+                    row = self.source.get(index)
+                    if row is not None and (row[1], self.display_size) not in self.decoded_cache:
+                        self.executor.submit(self._prefetch, index, row[1])
+
+    def _prefetch(self, index, image_path):
+        # Worker thread; skip neighbours that fell out of the window while queued
+        if abs(index - self.index) > self.prefetch or (image_path, self.display_size) in self.decoded_cache:
+            return
+        try:
+            self.decoded_cache.put(image_path, self.display_size, decode_for_display(image_path, self.display_size))
+        except Exception as e:
+            print(f"Error prefetching {image_path}: {e}")
+
+    def destroy(self):
+        # Pending decodes check image_path and drop out once the window is gone
+        self.image_path = None
+        super().destroy()
+
+    def _display(self, image_path, image):
+        if image_path != self.image_path or not self.winfo_exists():
+            return
+        self.photo = ImageTk.PhotoImage(image)
+        self.image_label.configure(image=self.photo, text="")
 
-        tags_label = ttk.Label(info_frame, text=tags_text, justify=tk.LEFT)
-        tags_label.pack(anchor=tk.W)
-
-    def get_tags(self, image_path):
-        """Retrieve AI-generated tags from database for the given image_path"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            '''
-            SELECT tags.tag, tags.confidence FROM tags
-            JOIN images ON tags.image_id = images.id
-            WHERE images.path = ?
-            ORDER BY tags.confidence DESC
-            ''',
-            (image_path,),
-        )
-        tags = cursor.fetchall()
-        conn.close()
-        return tags
+    def _show_error(self, image_path, error):
+        if image_path == self.image_path and self.winfo_exists():
+            self.image_label.configure(image="", text=f"Error loading image: {error}")
@@ -1,32 +1,133 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk
 import threading
-import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from ..database.db_manager import DatabaseManager
-from ..ai.model_handler import AIModelHandler
-from ..search.search_engine import SearchEngine
+from ..database.embedding_store import EmbeddingStore
+from ..database.thumbnail_cache import ThumbnailCache
+from .photo_cache import PhotoImageCache
+from .decoded_cache import DecodedImageCache
+from .gallery_grid import GalleryGrid, DatabaseRowSource, ListRowSource
+from .image_viewer import ImageViewer
+from .startup_timer import StartupTimer
+from ..search.query_syntax import parse_query
+# The AI, search and ingestion modules pull in torch, clip and faiss; they are
+# imported on background threads so the window comes up without them
 
 
 class GalleryApp:
-    def __init__(self, config):
+    def __init__(self, config, timer=None):
         self.config = config
+        self.timer = timer or StartupTimer()
         self.root = tk.Tk()
         self.root.title("AI-Powered Offline Gallery")
         self.root.geometry(f"{config.WINDOW_WIDTH}x{config.WINDOW_HEIGHT}")
         
         # Initialize components
-        self.db_manager = DatabaseManager(config.DATABASE_PATH)
-        self.ai_handler = AIModelHandler(config)
-        self.search_engine = SearchEngine(self.db_manager, self.ai_handler, config)
-        
-        self.current_images = []
-        self.current_page = 0
+        embedding_store = EmbeddingStore(config.DATA_DIR, dtype=config.EMBEDDING_STORE_DTYPE)
+        self.db_manager = DatabaseManager(config.DATABASE_PATH, embedding_store)
+        # Filled in by background loaders; wait on the events before use
+        self.ai_handler = None
+        self.search_engine = None
+        self.index_ready = threading.Event()
+        self.model_ready = threading.Event()
+        self._model_requested = False
+        self._index_requested = False
+        self._startup_reported = False
+        # Set when SEARCH_SERVICE_URL points at a reachable search service;
+        # searches then go there, and this process only loads CLIP and the
+        # index for what the service does not do: ingestion and filtered search
+        self.search_client = None
+        self.preload_model = config.PRELOAD_MODEL and not config.SEARCH_SERVICE_URL
+        self.thumbnail_cache = ThumbnailCache(config.THUMBNAIL_CACHE_DIR, config.THUMBNAIL_SIZE,
+                                              config.THUMBNAIL_FORMAT)
+        self.photo_cache = PhotoImageCache(config.THUMBNAIL_MEMORY_CACHE_SIZE)
+        self.thumbnail_executor = ThreadPoolExecutor(max_workers=2)
+        # Decoded full-size images, shared by all viewer windows
+        self.decoded_cache = DecodedImageCache(config.VIEWER_CACHE_MB * 1024 * 1024)
+        self.viewer_executor = ThreadPoolExecutor(max_workers=2)
+        self.search_generation = 0
         
         self.setup_ui()
+        self.root.update_idletasks()
+        self.timer.mark("window")
         
-        # Build search index in a background thread
-        threading.Thread(target=self.search_engine.build_index, daemon=True).start()
+        # Start heavy loading only once the event loop is running and the window is drawn
+        self.root.after(0, self._start_background_loading)
+    
+    def _start_background_loading(self):
+        if self.config.SEARCH_SERVICE_URL:
+            threading.Thread(target=self._connect_search_service, daemon=True).start()
+        else:
+            self.request_index()
+        if self.preload_model:
+            self.request_model()
+    
+    def _connect_search_service(self):
+        from ..service.client import SearchClient
+        client = SearchClient(self.config.SEARCH_SERVICE_URL)
+        try:
+            health = client.health()
+        except (OSError, ValueError) as e:
+            print(f"Search service unavailable, searching locally: {e}")
+            self.root.after(0, self.request_index)
+            return
+        self.search_client = client
+        print(f"Using search service at {self.config.SEARCH_SERVICE_URL} ({health['indexed']} images indexed)")
+        self.timer.mark("search service")
+        self._on_loaded()
+
+    def request_index(self):
+        """Start loading the search index in the background, once"""
+        if not self._index_requested:
+            self._index_requested = True
+            threading.Thread(target=self._load_search_engine, daemon=True).start()
+    
+    def _load_search_engine(self):
+        from ..search.search_engine import SearchEngine
+        engine = SearchEngine(self.db_manager, None, self.config)
+        # Load the persisted search index; only a stale or missing index
+        # falls back to a full rebuild
+        if not engine.load_index():
+            engine.build_index()
+        self.search_engine = engine
+        self.timer.mark("search index")
+        self.index_ready.set()
+        self._on_loaded()
+    
+    def request_model(self):
+        """Start loading the CLIP model in the background, once"""
+        if not self._model_requested:
+            self._model_requested = True
+            threading.Thread(target=self._load_model, daemon=True).start()
+    
+    def _load_model(self):
+        from ..ai.model_handler import AIModelHandler
+        self.ai_handler = AIModelHandler(self.config)
+        self.timer.mark("model")
+        self.model_ready.set()
+        self._on_loaded()
+    
+    def _on_loaded(self):
+        search_ready = self.index_ready.is_set() or self.search_client is not None
+        if search_ready and (self.model_ready.is_set() or not self.preload_model) and not self._startup_reported:
+            self._startup_reported = True
+            report = self.timer.report()
+            print(report)
+            self.root.after(0, self.status_var.set, report)
+    
+    def _wait_for_model(self):
+        # Worker threads only: block until the model and the search index are usable
+        if not self.index_ready.is_set():
+            self.root.after(0, self.request_index)
+        if not self.model_ready.is_set():
+            self.root.after(0, self.request_model)
+            self.root.after(0, self.status_var.set, "Loading AI model...")
+            self.model_ready.wait()
+        self.index_ready.wait()
+        self.search_engine.ai_handler = self.ai_handler
+        return self.ai_handler.model is not None
     
     def setup_ui(self):
         # Main frame
@@ -57,16 +158,11 @@ class GalleryApp:
         self.progress_var = tk.DoubleVar()
         self.progress_bar = ttk.Progressbar(main_frame, variable=self.progress_var, maximum=100)
         
-        # Scrollable image display area
+        # Scrollable image display area, virtualized by GalleryGrid
         self.canvas = tk.Canvas(main_frame, bg="white")
         scrollbar = ttk.Scrollbar(main_frame, orient="vertical", command=self.canvas.yview)
-        self.scrollable_frame = ttk.Frame(self.canvas)
-        
-        self.scrollable_frame.bind("<Configure>", 
-            lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
-        
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.grid = GalleryGrid(self.canvas, scrollbar, self.config, self.thumbnail_cache,
+                                self.photo_cache, self.thumbnail_executor, on_open=self.show_image_details)
         
         self.canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
@@ -86,66 +182,110 @@ class GalleryApp:
             self.progress_bar.pack(fill=tk.X, pady=(5, 5))
             threading.Thread(target=self.process_folder, args=(folder_path,), daemon=True).start()
     
+    def process_folder(self, folder_path):
+        # Runs on a worker thread; all Tk updates are marshalled through root.after
+        from ..ingestion.pipeline import IngestionPipeline
+        from ..search.dedup import DuplicateFinder
+        if not self._wait_for_model():
+            self.root.after(0, self._finish_processing, "Cannot process folder: the AI model failed to load")
+            return
+        pipeline = IngestionPipeline(self.db_manager, self.ai_handler, self.config, self.thumbnail_cache)
+        try:
+            image_ids = pipeline.run(folder_path, progress_callback=self._report_progress,
+                                     batch_callback=self.search_engine.add_embeddings,
+                                     removed_callback=self.search_engine.remove_images)
+            self.search_engine.save_index()
+            clusters = DuplicateFinder(self.db_manager, self.search_engine, self.config).update(image_ids)
+            scan = pipeline.last_scan
+            skipped = f", {scan.unchanged} unchanged, {len(scan.vanished)} removed" if scan else ""
+            message = (f"Processed {len(image_ids)} images from {folder_path}{skipped} "
+                       f"({clusters} duplicate groups updated)")
+        except Exception as e:
+            print(f"Error processing folder: {e}")
+            message = f"Error processing folder: {e}"
+        self.root.after(0, self._finish_processing, message)
+    
+    def _report_progress(self, done, total, images_per_sec):
+        def update():
+            self.progress_var.set(100.0 * done / total)
+            self.status_var.set(f"Processing {done}/{total} images ({images_per_sec:.1f} images/sec)")
+        self.root.after(0, update)
+    
+    def _finish_processing(self, message):
+        self.progress_bar.pack_forget()
+        self.progress_var.set(0)
+        self.status_var.set(message)
+        self.load_existing_images()
+    
     def run(self):
         self.root.mainloop()
+        self.thumbnail_executor.shutdown(wait=False)
+        self.viewer_executor.shutdown(wait=False)
+        self.db_manager.close()
     
     def search_images(self, event=None):
-        # Placeholder: Implement your searching logic here
-        # For now, just a simple status update
         query = self.search_var.get().strip()
-        self.status_var.set(f"Search triggered for query: '{query}'")
-        # TODO: Perform actual search and update displayed images
+        if not query:
+            self.show_all_images()
+            return
+        # Only the most recent query may update the grid
+        self.search_generation += 1
+        self.status_var.set(f"Searching for '{query}'...")
+        threading.Thread(target=self._run_search, args=(query, self.search_generation), daemon=True).start()
+    
+    def _run_search(self, query, generation):
+        text, filters = parse_query(query)
+        if filters and not text:
+            self._run_filter(query, generation, filters)
+            return
+        # The search service answers plain text queries; filtered ones run locally
+        if self.search_client is not None and not filters:
+            try:
+                results, timings = self.search_client.search_text(query, self.config.SEARCH_RESULTS_LIMIT)
+                self.root.after(0, self._show_search_results, query, generation, results, timings)
+                return
+            except (OSError, ValueError) as e:
+                print(f"Search service request failed, searching locally: {e}")
+                self.search_client = None
+        if not self._wait_for_model() or not self.search_engine.index:
+            self.root.after(0, self.status_var.set, "Search is not available: no model or no indexed images")
+            return
+        self.root.after(0, self.status_var.set, f"Searching for '{query}'...")
+        if filters:
+            results, timings = self.search_engine.search_filtered(text, self.config.SEARCH_RESULTS_LIMIT, **filters)
+        else:
+            results, timings = self.search_engine.search_text(query, self.config.SEARCH_RESULTS_LIMIT)
+        self.root.after(0, self._show_search_results, query, generation, results, timings)
+    
+    def _run_filter(self, query, generation, filters):
+        # Filters without text: list the matching images, no model needed
+        start = time.perf_counter()
+        image_ids = self.db_manager.get_filtered_image_ids(**filters)[:self.config.SEARCH_RESULTS_LIMIT].tolist()
+        paths = self.db_manager.get_image_paths(image_ids)
+        results = [(image_id, paths[image_id], 0.0) for image_id in image_ids if image_id in paths]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        timings = {"filter": elapsed_ms, "total": elapsed_ms}
+        self.root.after(0, self._show_search_results, query, generation, results, timings)
+    
+    def _show_search_results(self, query, generation, results, timings):
+        from ..search.search_engine import format_timings
+        if generation != self.search_generation:
+            return
+        rows = [(image_id, path) for image_id, path, _ in results]
+        self.grid.set_source(ListRowSource(rows), empty_message=f"No images match '{query}'.")
+        self.status_var.set(f"{len(rows)} results for '{query}' in {format_timings(timings)}")
     
     def show_all_images(self):
         # Reset search and reload all images
         self.search_var.set('')
+        self.search_generation += 1
         self.load_existing_images()
         self.status_var.set("Showing all images")
     
     def load_existing_images(self):
-        # Placeholder: Load images from database and display
-        self.current_images = self.db_manager.get_images()
-        self.current_page = 0
-        self.display_current_page()
-    
-    def display_current_page(self):
-        # Clear current images in UI
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-        
-        if not self.current_images:
-            ttk.Label(self.scrollable_frame, text="No images found. Add a folder to get started.", font=("Arial", 16)).pack(expand=True, pady=50)
-            return
-        
-        # Pagination logic
-        start_index = self.current_page * self.config.IMAGES_PER_PAGE
-        end_index = start_index + self.config.IMAGES_PER_PAGE
-        images_to_show = self.current_images[start_index:end_index]
-        
-        cols = self.config.GRID_COLUMNS
-        for i, image_data in enumerate(images_to_show):
-            row = i // cols
-            col = i % cols
-            image_path = image_data[1]  # Assuming image path is at index 1
-            
-            frame = ttk.Frame(self.scrollable_frame, relief=tk.RAISED, borderwidth=2)
-            frame.grid(row=row, column=col, padx=5, pady=5)
-            
-            try:
-                img = Image.open(image_path)
-                img.thumbnail(self.config.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
-                
-                label = ttk.Label(frame, image=photo)
-                label.image = photo  # keep reference
-                label.pack(pady=5)
-                
-                filename = os.path.basename(image_path)
-                if len(filename) > 25:
-                    filename = filename[:22] + "..."
-                ttk.Label(frame, text=filename, font=("Arial", 8)).pack()
-                
-                # Clicking image could show detail - implement as needed
-                # label.bind("<Button-1>", lambda e, p=image_path: self.show_image_details(p))
-            except Exception as e:
-                ttk.Label(frame, text="Error loading image", font=("Arial", 8)).pack(pady=20)
+        self.grid.set_source(DatabaseRowSource(self.db_manager, self.config.IMAGES_PER_PAGE))
+    
+    def show_image_details(self, index):
+        if self.grid.source.get(index) is not None:
+            ImageViewer(self.root, self.db_manager, self.grid.source, index, self.decoded_cache,
+                        self.viewer_executor, self.config)
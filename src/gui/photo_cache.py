@@ -0,0 +1,26 @@
+from collections import OrderedDict
+from PIL import ImageTk
+
+
+class PhotoImageCache:
+    """In-memory LRU of Tk PhotoImage thumbnails, keyed by original image path"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.photos = OrderedDict()
+
+    def get(self, image_path):
+        """Return a cached PhotoImage without touching disk, or None"""
+        photo = self.photos.get(image_path)
+        if photo is not None:
+            self.photos.move_to_end(image_path)
+        return photo
+
+    def put(self, image_path, image):
+        """Wrap a PIL image as a PhotoImage and cache it (Tk main thread only)"""
+        photo = ImageTk.PhotoImage(image)
+        self.photos[image_path] = photo
+        self.photos.move_to_end(image_path)
+        while len(self.photos) > self.capacity:
+            self.photos.popitem(last=False)
+        return photo
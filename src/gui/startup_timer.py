@@ -0,0 +1,18 @@
+import time
+
+
+class StartupTimer:
+    """Milestones since process start, printed as they happen and as one summary line"""
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.marks = []
+
+    def mark(self, name):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        self.marks.append((name, elapsed_ms))
+        print(f"[startup] {name}: {elapsed_ms:.0f} ms")
+        return elapsed_ms
+
+    def report(self):
+        return "Startup: " + ", ".join(f"{name} {elapsed_ms:.0f} ms" for name, elapsed_ms in self.marks)
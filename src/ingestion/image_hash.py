@@ -0,0 +1,48 @@
+import hashlib
+from PIL import Image
+
+HASH_BITS = 64
+
+
+def dhash(img, hash_size=8):
+    """64-bit difference hash of a PIL image.
+
+    Compares horizontally adjacent pixels of a (hash_size+1) x hash_size
+    grayscale thumbnail, so it survives resizing, re-encoding and small
+    colour changes. Returned as a signed 64-bit int so it fits an SQLite
+    INTEGER column.
+    """
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes returned by dhash"""
+    return bin((a ^ b) & ((1 << HASH_BITS) - 1)).count("1")
+
+
+def content_hash(path, chunk_size=1 << 20):
+    """blake2b fingerprint of a file's entire contents.
+
+    A rescan runs it for files whose mtime moved, to tell a
+    touched-but-identical file from a modified one. Every byte is read, so
+    an edit anywhere in the file (including a same-size edit in the middle
+    of an uncompressed BMP or TIFF) is caught. Ingestion hashes the bytes it
+    reads for decoding instead, with content_hash_bytes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_hash_bytes(data):
+    """content_hash of a file whose bytes are already in memory"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
@@ -0,0 +1,185 @@
+import io
+import os
+import sys
+import time
+import multiprocessing
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from .image_hash import dhash, content_hash_bytes
+from .scanner import scan_folder
+
+
+DecodedImage = namedtuple("DecodedImage", "path size width height mtime_ns content_hash phash pixels")
+
+
+# Per-worker state, set once by _init_worker instead of being pickled with every task
+_worker_preprocess = None
+_worker_draft_size = None
+_worker_thumbnail_cache = None
+
+
+def _init_worker(preprocess, draft_size, thumbnail_cache):
+    global _worker_preprocess, _worker_draft_size, _worker_thumbnail_cache
+    # Worker diagnostics go to stderr: stdout belongs to the parent, which
+    # may be emitting JSON lines (python -m src --json)
+    sys.stdout = sys.stderr
+    _worker_preprocess = preprocess
+    _worker_draft_size = draft_size
+    _worker_thumbnail_cache = thumbnail_cache
+
+
+def _load_image(path):
+    """Decode and preprocess one image in a worker process, writing its grid
+    thumbnail from the same decode.
+
+    Returns a DecodedImage or ``None`` if the file cannot be decoded.
+    """
+    try:
+        # Read the file once: the same bytes are hashed and decoded
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+        size = stat.st_size
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+            # JPEG draft mode lets libjpeg decode at a reduced scale, which is
+            # far cheaper than decoding full resolution and resizing afterwards
+            if _worker_draft_size:
+                img.draft("RGB", (_worker_draft_size, _worker_draft_size))
+            rgb = img.convert("RGB")
+        if _worker_thumbnail_cache is not None:
+            try:
+                _worker_thumbnail_cache.create_from_image(path, rgb, stat)
+            except Exception as e:
+                print(f"Error creating thumbnail for {path}: {e}")
+        phash = dhash(rgb)
+        pixels = _worker_preprocess(rgb)
+        if hasattr(pixels, "numpy"):
+            pixels = pixels.numpy()
+        return DecodedImage(path, size, width, height, stat.st_mtime_ns, content_hash_bytes(data),
+                            phash, np.asarray(pixels, dtype=np.float32))
+    except Exception as e:
+        print(f"Error decoding {path}: {e}")
+        return None
+
+
+class IngestionPipeline:
+    """Decode images in a process pool and run batched CLIP inference on them.
+
+    Workers decode and preprocess files in parallel while the calling thread
+    encodes stacked batches of ``BATCH_PROCESSING_SIZE`` images and writes
+    each batch to the database in a single transaction.
+    """
+
+    def __init__(self, db_manager, ai_handler, config, thumbnail_cache=None):
+        self.db_manager = db_manager
+        self.ai_handler = ai_handler
+        self.config = config
+        self.thumbnail_cache = thumbnail_cache
+        self.last_scan = None
+        self.batch_size = max(1, config.BATCH_PROCESSING_SIZE)
+        self.num_workers = max(1, config.INGEST_WORKERS)
+
+    def run(self, folder_path, progress_callback=None, batch_callback=None, removed_callback=None):
+        """Ingest every image below folder_path.
+
+        Unchanged files are skipped before decoding (see scan_folder) and
+        files that vanished are deleted. ``progress_callback(done, total,
+        images_per_sec)`` is called after each batch, ``batch_callback(image_ids,
+        embeddings)`` once each batch is committed and ``removed_callback(image_ids)``
+        after vanished files are deleted. Returns the ids of the images written
+        to the database; the scan summary is kept in ``self.last_scan``.
+        """
+        if not self.ai_handler.model:
+            return []
+        scan = scan_folder(folder_path, self.config, self.db_manager)
+        self.last_scan = scan
+        if scan.vanished:
+            self.db_manager.delete_images(scan.vanished)
+            if removed_callback:
+                removed_callback(scan.vanished)
+        if scan.touched:
+            self.db_manager.update_mtimes(scan.touched)
+
+        paths = scan.to_process
+        total = len(paths)
+        if total == 0:
+            return []
+
+        image_ids = []
+        done = 0
+        start = time.perf_counter()
+        for batch in self._decoded_batches(paths):
+            batch_ids, features = self._process_batch(batch)
+            image_ids.extend(batch_ids)
+            if batch_callback and batch_ids:
+                batch_callback(batch_ids, features)
+            # Files that failed to decode still count towards progress
+            done = min(total, done + batch.attempted)
+            if progress_callback:
+                elapsed = time.perf_counter() - start
+                progress_callback(done, total, len(image_ids) / elapsed if elapsed > 0 else 0.0)
+        return image_ids
+
+    def _decoded_batches(self, paths):
+        # spawn avoids forking a process that already holds Tk and torch threads
+        context = multiprocessing.get_context("spawn")
+        # Large enough for the model input and for grid thumbnails
+        draft_size = max(self.ai_handler.input_resolution() * 2, *self.config.THUMBNAIL_SIZE)
+        # Bound the number of in-flight decodes so memory stays flat on huge folders
+        max_pending = self.batch_size * self.num_workers * 2
+
+        with ProcessPoolExecutor(max_workers=self.num_workers, mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(self.ai_handler.preprocess, draft_size,
+                                           self.thumbnail_cache)) as executor:
+            pending = deque()
+            remaining = iter(paths)
+            batch = _Batch()
+            while True:
+                while len(pending) < max_pending:
+                    path = next(remaining, None)
+                    if path is None:
+                        break
+                    pending.append(executor.submit(_load_image, path))
+                if not pending:
+                    break
+
+                batch.add(pending.popleft().result())
+                if batch.attempted >= self.batch_size:
+                    yield batch
+                    batch = _Batch()
+            if batch.attempted:
+                yield batch
+
+    def _process_batch(self, batch):
+        if not batch.items:
+            return [], None
+        pixels = np.stack([item.pixels for item in batch.items])
+        features, tags = self.ai_handler.analyze(pixels)
+        if features is None:
+            return [], None
+
+        records = [
+            (item.path, os.path.basename(item.path), item.size, item.width, item.height, features[i], tags[i],
+             item.phash, item.mtime_ns, item.content_hash)
+            for i, item in enumerate(batch.items)
+        ]
+        try:
+            return self.db_manager.add_processed_batch(records), features
+        except Exception as e:
+            print(f"Error writing batch to database: {e}")
+            return [], None
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.attempted = 0
+
+    def add(self, item):
+        self.attempted += 1
+        if item is not None:
+            self.items.append(item)
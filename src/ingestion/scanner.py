@@ -0,0 +1,61 @@
+import os
+from .image_hash import content_hash
+
+
+class ScanResult:
+    def __init__(self):
+        self.to_process = []  # New, modified or never fully processed files
+        self.unchanged = 0
+        self.touched = []  # (mtime_ns, image_id) for files whose mtime moved but bytes did not
+        self.vanished = []  # Image ids whose file is gone
+
+
+def walk_folder(folder_path, config):
+    """Yield ``(path, stat)`` for supported, size-valid images below folder_path"""
+    for dirpath, _, filenames in os.walk(os.path.abspath(folder_path)):
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            if not config.is_supported_format(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_size > config.MAX_IMAGE_SIZE:
+                continue
+            yield path, stat
+
+
+def scan_folder(folder_path, config, db_manager):
+    """Compare a folder against the database without decoding anything.
+
+    Files whose size and mtime match a processed row are skipped outright.
+    If only the mtime moved, the fast content hash decides. Rows under the
+    folder whose file no longer exists are reported as vanished. Rows left
+    with ``processed = FALSE`` by an interrupted ingestion are picked up again.
+    """
+    known = db_manager.get_scan_state(os.path.abspath(folder_path))
+    result = ScanResult()
+    for path, stat in walk_folder(folder_path, config):
+        row = known.pop(path, None)
+        if row is None:
+            result.to_process.append(path)
+            continue
+        image_id, size, mtime_ns, stored_hash, processed = row
+        if not processed or size != stat.st_size:
+            result.to_process.append(path)
+        elif mtime_ns == stat.st_mtime_ns:
+            result.unchanged += 1
+        else:
+            try:
+                same = stored_hash is not None and content_hash(path) == stored_hash
+            except OSError:
+                same = False
+            if same:
+                result.touched.append((stat.st_mtime_ns, image_id))
+                result.unchanged += 1
+            else:
+                result.to_process.append(path)
+    # Rows not seen by the walk: gone, unless merely filtered out (e.g. now too large)
+    result.vanished = [row[0] for path, row in known.items() if not os.path.exists(path)]
+    return result
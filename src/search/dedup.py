@@ -0,0 +1,139 @@
+import numpy as np
+import faiss
+from ..ingestion.image_hash import hamming_distance
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        self.parent.setdefault(item, item)
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # Path compression keeps later lookups near O(1)
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    def groups(self):
+        groups = {}
+        for item in self.parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return [sorted(members) for members in groups.values() if len(members) > 1]
+
+
+class DuplicateFinder:
+    """Groups near-duplicate images into clusters stored in the database.
+
+    Candidates come from two sub-quadratic sources: identical perceptual
+    hashes (an indexed equality join) and a range search of the FAISS index,
+    issued in blocks of DEDUP_BLOCK_SIZE query vectors. Hash candidates are
+    confirmed by embedding similarity, embedding candidates by perceptual-hash
+    distance when both images have a hash.
+    Confirmed pairs are merged with existing clusters via union-find, so
+    adding a folder only searches for the new images.
+    """
+
+    def __init__(self, db_manager, search_engine, config):
+        self.db_manager = db_manager
+        self.search_engine = search_engine
+        self.config = config
+
+    def rebuild(self):
+        """Recompute every cluster in the library; returns the number of clusters"""
+        image_ids, _ = self.db_manager.get_all_embeddings()
+        image_ids = [int(i) for i in image_ids]
+        pairs = self._hash_pairs(self.db_manager.get_phash_pairs())
+        pairs.extend(self._embedding_pairs(image_ids))
+        clusters = self._cluster(pairs, existing={})
+        self.db_manager.save_duplicate_clusters(clusters, replace_all=True)
+        return len(clusters)
+
+    def update(self, image_ids):
+        """Cluster newly ingested images against the whole library.
+
+        Returns the number of clusters that gained members.
+        """
+        image_ids = [int(i) for i in image_ids]
+        if not image_ids:
+            return 0
+        pairs = self._hash_pairs(self.db_manager.get_phash_pairs(image_ids))
+        pairs.extend(self._embedding_pairs(image_ids))
+        if not pairs:
+            return 0
+        involved = {image_id for pair in pairs for image_id in pair}
+        existing = self.db_manager.get_duplicate_clusters_for_images(involved)
+        clusters = self._cluster(pairs, existing)
+        self.db_manager.save_duplicate_clusters(clusters)
+        return len(clusters)
+
+    def _hash_pairs(self, pairs):
+        # Equal hashes only propose a pair; it also needs similar embeddings
+        threshold = self.config.DEDUP_SIMILARITY_THRESHOLD
+        block_size = self.config.DEDUP_BLOCK_SIZE
+        confirmed = []
+        for start in range(0, len(pairs), block_size):
+            block = pairs[start:start + block_size]
+            found_ids, embeddings = self.db_manager.get_embeddings_for_images(
+                {image_id for pair in block for image_id in pair})
+            if not found_ids:
+                continue
+            embeddings = np.array(embeddings, dtype=np.float32)
+            faiss.normalize_L2(embeddings)
+            rows = {image_id: row for row, image_id in enumerate(found_ids)}
+            for a, b in block:
+                if a in rows and b in rows and float(embeddings[rows[a]] @ embeddings[rows[b]]) >= threshold:
+                    confirmed.append((a, b))
+        return confirmed
+
+    def _embedding_pairs(self, image_ids):
+        index = self.search_engine.index
+        if index is None:
+            return []
+        threshold = self.config.DEDUP_SIMILARITY_THRESHOLD
+        max_distance = self.config.DEDUP_MAX_HASH_DISTANCE
+        block_size = self.config.DEDUP_BLOCK_SIZE
+
+        pairs = []
+        for start in range(0, len(image_ids), block_size):
+            found_ids, embeddings = self.db_manager.get_embeddings_for_images(image_ids[start:start + block_size])
+            if not found_ids:
+                continue
+            queries = np.array(embeddings, dtype=np.float32)
+            faiss.normalize_L2(queries)
+            with self.search_engine.lock:
+                lims, _, neighbours = index.range_search(queries, threshold)
+
+            candidates = []
+            for row, image_id in enumerate(found_ids):
+                for neighbour in neighbours[lims[row]:lims[row + 1]]:
+                    if neighbour != image_id and neighbour != -1:
+                        candidates.append((image_id, int(neighbour)))
+            if not candidates:
+                continue
+
+            phashes = self.db_manager.get_phashes({image_id for pair in candidates for image_id in pair})
+            for a, b in candidates:
+                # Semantically identical but visually different (e.g. two shots of
+                # the same scene) is not a duplicate; the hash vetoes those
+                if a in phashes and b in phashes and hamming_distance(phashes[a], phashes[b]) > max_distance:
+                    continue
+                pairs.append((a, b))
+        return pairs
+
+    @staticmethod
+    def _cluster(pairs, existing):
+        union_find = _UnionFind()
+        for members in existing.values():
+            for member in members[1:]:
+                union_find.union(members[0], member)
+        for a, b in pairs:
+            union_find.union(a, b)
+        return union_find.groups()
@@ -0,0 +1,152 @@
+import time
+import numpy as np
+import faiss
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# Historical FAISS_INDEX_TYPE values mapped onto the current names
+_ALIASES = {"indexflatip": "flat", "ivfflat": "ivf_flat", "ivfpq": "ivf_pq"}
+
+# faiss warns below ~39 training points per IVF list and needs 256 per PQ codebook
+_MIN_POINTS_PER_LIST = 39
+_MIN_PQ_TRAINING = 256 * 39
+
+
+def resolve_index_type(config, n_vectors):
+    """Map FAISS_INDEX_TYPE (or "auto") onto a concrete index type for n_vectors"""
+    index_type = str(config.FAISS_INDEX_TYPE).lower()
+    index_type = _ALIASES.get(index_type, index_type)
+    if index_type == "auto":
+        if n_vectors < config.FAISS_AUTO_IVF_THRESHOLD:
+            index_type = "flat"
+        elif n_vectors < config.FAISS_AUTO_PQ_THRESHOLD:
+            index_type = "ivf_flat"
+        else:
+            index_type = "ivf_pq"
+    if index_type not in INDEX_TYPES:
+        print(f"Unknown FAISS index type '{config.FAISS_INDEX_TYPE}', using flat.")
+        return "flat"
+
+    # Too few vectors to train the coarse quantizer / PQ codebooks reliably
+    if index_type in ("ivf_flat", "ivf_pq") and n_vectors < _MIN_POINTS_PER_LIST * 16:
+        return "flat"
+    if index_type == "ivf_pq" and n_vectors < _MIN_PQ_TRAINING:
+        return "ivf_flat"
+    return index_type
+
+
+def create_index(index_type, d, n_vectors, config):
+    """Create an empty, untrained inner-product index that accepts add_with_ids"""
+    if index_type == "flat":
+        description = "IDMap,Flat"
+    elif index_type == "hnsw":
+        description = f"IDMap,HNSW{config.FAISS_HNSW_M}"
+    else:
+        nlist = _nlist(n_vectors, config)
+        if index_type == "ivf_flat":
+            description = f"IVF{nlist},Flat"
+        else:
+            description = f"IVF{nlist},PQ{_pq_subquantizers(d, config.FAISS_PQ_M)}"
+    return faiss.index_factory(d, description, faiss.METRIC_INNER_PRODUCT)
+
+
+def train_index(index, embeddings, config):
+    """Train on a random sample of the (normalized) embeddings if the index needs it"""
+    if index.is_trained:
+        return
+    sample_size = min(len(embeddings), config.FAISS_TRAIN_SAMPLE_SIZE)
+    if sample_size < len(embeddings):
+        rng = np.random.default_rng(0)
+        rows = np.sort(rng.choice(len(embeddings), sample_size, replace=False))
+        sample = embeddings[rows]
+    else:
+        sample = embeddings
+    index.train(np.ascontiguousarray(sample, dtype=np.float32))
+
+
+def apply_search_params(index, index_type, config):
+    """Set nprobe / efSearch, the recall-versus-latency knobs of IVF and HNSW"""
+    params = faiss.ParameterSpace()
+    if index_type in ("ivf_flat", "ivf_pq"):
+        params.set_index_parameter(index, "nprobe", config.FAISS_NPROBE)
+    elif index_type == "hnsw":
+        params.set_index_parameter(index, "efSearch", config.FAISS_EF_SEARCH)
+
+
+def search_parameters(index_type, config, selector):
+    """Per-query search parameters restricting results to ids accepted by selector.
+
+    Explicit parameters replace the index's own nprobe / efSearch, so the
+    configured values are passed again here.
+    """
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=config.FAISS_NPROBE)
+    if index_type == "hnsw":
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=config.FAISS_EF_SEARCH)
+    return faiss.SearchParameters(sel=selector)
+
+
+def supports_removal(index_type):
+    # HNSW graphs cannot drop nodes; deletions there require a rebuild
+    return index_type != "hnsw"
+
+
+def build_index(index_type, image_ids, embeddings, config):
+    """Create, train and fill an index of the given type from normalized embeddings"""
+    index = create_index(index_type, embeddings.shape[1], len(embeddings), config)
+    train_index(index, embeddings, config)
+    index.add_with_ids(embeddings, np.asarray(image_ids, dtype=np.int64))
+    apply_search_params(index, index_type, config)
+    return index
+
+
+def recall_latency_report(image_ids, embeddings, config, k=10, n_queries=200, index_types=INDEX_TYPES):
+    """Compare index types against the exact flat baseline.
+
+    Queries are a random sample of the stored (normalized) embeddings. Returns
+    one dict per index type with recall@k, mean per-query latency, build time
+    and serialized size.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(embeddings), min(n_queries, len(embeddings)), replace=False)
+    queries = embeddings[rows]
+
+    report = []
+    truth = None
+    for index_type in ("flat",) + tuple(t for t in index_types if t != "flat"):
+        start = time.perf_counter()
+        index = build_index(index_type, image_ids, embeddings, config)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        # One query at a time, matching interactive search
+        found = np.vstack([index.search(queries[i:i + 1], k)[1] for i in range(len(queries))])
+        latency_ms = 1000.0 * (time.perf_counter() - start) / len(queries)
+
+        if truth is None:
+            truth = found
+        hits = sum(len(set(found[i]) & set(truth[i]) - {-1}) for i in range(len(queries)))
+        report.append({
+            "index_type": index_type,
+            "recall_at_k": hits / float(truth.size),
+            "latency_ms": latency_ms,
+            "build_seconds": build_seconds,
+            "size_bytes": int(faiss.serialize_index(index).nbytes),
+        })
+    return report
+
+
+def _nlist(n_vectors, config):
+    if config.FAISS_NLIST:
+        return config.FAISS_NLIST
+    # Usual rule of thumb: ~4*sqrt(n) lists, with enough points to train each
+    nlist = int(4 * np.sqrt(n_vectors))
+    return max(1, min(nlist, n_vectors // _MIN_POINTS_PER_LIST))
+
+
+def _pq_subquantizers(d, m):
+    # PQ needs the dimension to split evenly into m sub-vectors
+    while m > 1 and d % m:
+        m -= 1
+    return m
@@ -0,0 +1,50 @@
+import re
+
+# Search box prefix -> keyword argument of DatabaseManager.get_filtered_image_ids
+_FILTER_KEYS = {
+    "tag": "tags",
+    "folder": "folder",
+    "after": "created_after",
+    "before": "created_before",
+    "minwidth": "min_width",
+    "maxwidth": "max_width",
+    "minheight": "min_height",
+    "maxheight": "max_height",
+    "confidence": "min_confidence",
+}
+_NUMERIC = {"min_width", "max_width", "min_height", "max_height"}
+
+# Whitespace-separated tokens in which double-quoted runs may contain spaces.
+# Only " quotes: apostrophes and backslashes are ordinary characters, as in
+# dog's or C:\Users\me; an unterminated quote runs to the end of the text
+_TOKEN = re.compile(r'(?:"[^"]*(?:"|$)|[^\s"])+')
+
+
+def parse_query(text):
+    """Split search box input into free text and filter predicates.
+
+    ``beach tag:dog folder:"/photos/2023 trip" after:2024-01-01`` yields
+    ``("beach", {"tags": ["dog"], "folder": "/photos/2023 trip",
+    "created_after": "2024-01-01"})``. ``tag:`` may repeat; unknown prefixes
+    and malformed values stay part of the text.
+    """
+    words, filters = [], {}
+    for token in (match.replace('"', "") for match in _TOKEN.findall(text)):
+        key, separator, value = token.partition(":")
+        name = _FILTER_KEYS.get(key.lower())
+        if not separator or name is None or not value:
+            words.append(token)
+            continue
+        try:
+            if name in _NUMERIC:
+                value = int(value)
+            elif name == "min_confidence":
+                value = float(value)
+        except ValueError:
+            words.append(token)
+            continue
+        if name == "tags":
+            filters.setdefault("tags", []).append(value)
+        else:
+            filters[name] = value
+    return " ".join(words), filters
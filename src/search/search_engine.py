@@ -1,6 +1,13 @@
+import json
+import numbers
+import os
+import threading
+import time
+from collections import OrderedDict
 import numpy as np
 import faiss
-import torch
+from .index_factory import (resolve_index_type, build_index as build_faiss_index,
+                            apply_search_params, search_parameters, supports_removal, recall_latency_report)
 
 class SearchEngine:
     def __init__(self, db_manager, ai_handler, config):
@@ -8,7 +15,80 @@ class SearchEngine:
         self.ai_handler = ai_handler
         self.config = config
         self.index = None
-        self.image_ids = []
+        self.index_type = None
+        self.index_path = config.INDEX_PATH
+        self.meta_path = config.INDEX_PATH.with_suffix(".json")
+        # Guards self.index: ingestion threads mutate it while the GUI searches
+        self.lock = threading.Lock()
+        # Set when an index that cannot replace vectors (HNSW) was given new
+        # embeddings for images it already holds; save_index rebuilds it
+        self.needs_rebuild = False
+        # Query text -> normalized text embedding, most recently used last
+        self.query_cache = OrderedDict()
+
+    def load_or_build_index(self):
+        """Load the persisted index if it matches the database, otherwise rebuild it"""
+        if not self.load_index():
+            self.build_index()
+
+    def load_index(self):
+        """Load the index from DATA_DIR if its generation matches the database.
+
+        Flat and HNSW indexes are memory-mapped; IVF indexes are read into memory.
+
+        Returns True when a valid index was loaded.
+        """
+        if not self.index_path.exists() or not self.meta_path.exists():
+            return False
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta.get("generation") != self.db_manager.get_generation():
+                print("Persisted FAISS index is stale.")
+                return False
+            # The configured type (or auto choice for this size) may have changed
+            index_type = meta.get("index_type", "flat")
+            if index_type != resolve_index_type(self.config, meta.get("count", 0)):
+                print("FAISS index type changed.")
+                return False
+            # IVF indexes memory-map their inverted lists as read-only
+            # OnDiskInvertedLists, which reject the adds and removes of later
+            # ingests and re-serialize as a stub pointing at this very file
+            flags = 0 if index_type in ("ivf_flat", "ivf_pq") else faiss.IO_FLAG_MMAP
+            index = faiss.read_index(str(self.index_path), flags)
+            apply_search_params(index, index_type, self.config)
+        except Exception as e:
+            print(f"Error loading FAISS index: {e}")
+            return False
+
+        with self.lock:
+            self.index = index
+            self.index_type = index_type
+            self.needs_rebuild = False
+        print(f"FAISS index loaded with {index.ntotal} images.")
+        return True
+
+    def save_index(self):
+        """Persist the index together with the database generation it reflects"""
+        if self.needs_rebuild:
+            # build_index persists the rebuilt index itself
+            self.build_index()
+            return
+        with self.lock:
+            if self.index is None:
+                return
+            generation = self.db_manager.get_generation()
+            # Write beside the live file and swap, so a memory-mapped index
+            # never sees its backing file truncated underneath it
+            tmp_path = self.index_path.with_suffix(".tmp")
+            try:
+                faiss.write_index(self.index, str(tmp_path))
+                os.replace(tmp_path, self.index_path)
+                with open(self.meta_path, "w") as f:
+                    json.dump({"generation": generation, "count": int(self.index.ntotal),
+                               "index_type": self.index_type}, f)
+            except Exception as e:
+                print(f"Error saving FAISS index: {e}")
 
     def build_index(self):
         # Retrieve image IDs and their embeddings from the DB
@@ -17,41 +97,273 @@ class SearchEngine:
             print("No embeddings found. Process images first.")
             return
 
-        self.image_ids = image_ids
-        d = embeddings.shape[1]
+        # Normalize a float32 copy so inner product equals cosine similarity;
+        # the source may be a read-through mmap of the embedding store
+        embeddings = np.array(embeddings, dtype=np.float32)
+        faiss.normalize_L2(embeddings)
 
-        # Create index for inner product (cosine similarity with normalized vectors)
-        self.index = faiss.IndexFlatIP(d)
-        self.index = faiss.IndexIDMap(self.index)
+        index_type = resolve_index_type(self.config, len(embeddings))
+        index = build_faiss_index(index_type, image_ids, embeddings, self.config)
+        with self.lock:
+            self.index = index
+            self.index_type = index_type
+            self.needs_rebuild = False
+        print(f"FAISS {index_type} index built with {len(embeddings)} images.")
+        self.save_index()
 
-        # Normalize embeddings before indexing
+    def add_embeddings(self, image_ids, embeddings):
+        """Apply newly ingested (or re-processed) embeddings to the index in place"""
+        if len(image_ids) == 0:
+            return
+        embeddings = np.array(embeddings, dtype=np.float32)
         faiss.normalize_L2(embeddings)
+        ids = np.array(image_ids, dtype=np.int64)
+        with self.lock:
+            if self.index is None:
+                self.index_type = resolve_index_type(self.config, len(ids))
+                self.index = build_faiss_index(self.index_type, ids, embeddings, self.config)
+                return
+            if supports_removal(self.index_type):
+                # Replace rather than duplicate vectors for images that were re-processed
+                self.index.remove_ids(ids)
+            else:
+                # Re-processed images keep their old vector until the rebuild
+                # on save; only images new to the index are added now
+                present = np.isin(ids, faiss.vector_to_array(self.index.id_map))
+                if present.any():
+                    self.needs_rebuild = True
+                    embeddings, ids = embeddings[~present], ids[~present]
+            if len(ids):
+                self.index.add_with_ids(embeddings, ids)
 
-        # Add embeddings and IDs to index
-        self.index.add_with_ids(embeddings.astype(np.float32), np.array(image_ids, dtype=np.int64))
-        print(f"FAISS index built with {len(embeddings)} images.")
+    def remove_images(self, image_ids):
+        """Drop deleted images from the index in place"""
+        if len(image_ids) == 0:
+            return
+        with self.lock:
+            if self.index is None:
+                return
+            needs_rebuild = not supports_removal(self.index_type)
+            if not needs_rebuild:
+                self.index.remove_ids(np.array(image_ids, dtype=np.int64))
+        if needs_rebuild:
+            self.build_index()
 
-    def search_similar_images(self, query_text, top_k=10):
-        if not self.index or not self.ai_handler.model:
+    def index_report(self, k=10, n_queries=200):
+        """Recall@k and latency of every index type against the flat baseline"""
+        image_ids, embeddings = self.db_manager.get_all_embeddings()
+        if len(embeddings) == 0:
             return []
+        embeddings = np.array(embeddings, dtype=np.float32)
+        faiss.normalize_L2(embeddings)
+        return recall_latency_report(image_ids, embeddings, self.config, k=k, n_queries=n_queries)
 
-        try:
-            # Preprocess and encode text query
-            tokens = self.ai_handler.preprocess_text(query_text).to(self.ai_handler.device)
-            with torch.no_grad():
-                text_features = self.ai_handler.model.encode_text(tokens)
-                text_features = text_features.cpu().numpy().astype(np.float32)
+    def encode_query(self, query_text, timings=None):
+        """Normalized embedding for a text query, served from the LRU when repeated"""
+        return self.encode_queries([query_text], timings)
 
-            # Normalize the query embedding vector
-            faiss.normalize_L2(text_features)
+    def encode_queries(self, texts, timings=None):
+        """Normalized (N, D) embeddings for text queries.
 
-            # Search to find top_k most similar image embeddings
-            scores, indices = self.index.search(text_features, top_k)
+        Cached queries come from the LRU; the rest are tokenized and encoded
+        together in a single forward pass.
+        """
+        vectors = {}
+        with self.lock:
+            for text in texts:
+                cached = self.query_cache.get(text)
+                if cached is not None:
+                    self.query_cache.move_to_end(text)
+                    vectors[text] = cached
+        missing = list(dict.fromkeys(text for text in texts if text not in vectors))
 
-            # Collect valid results (filter out -1 which means no result)
-            results = [(int(i), float(score)) for i, score in zip(indices[0], scores[0]) if i != -1]
+        tokenize_ms = encode_ms = 0.0
+        if missing:
+            start = time.perf_counter()
+            tokens = self.ai_handler.preprocess_text(missing)
+            tokenized = time.perf_counter()
+            encoded = self.ai_handler.encode_text(tokens)
+            tokenize_ms = (tokenized - start) * 1000
+            encode_ms = (time.perf_counter() - tokenized) * 1000
+            with self.lock:
+                for text, vector in zip(missing, encoded):
+                    vector = vector[np.newaxis, :]
+                    vectors[text] = vector
+                    self.query_cache[text] = vector
+                while len(self.query_cache) > self.config.QUERY_CACHE_SIZE:
+                    self.query_cache.popitem(last=False)
+        if timings is not None:
+            timings.update(tokenize=tokenize_ms, encode=encode_ms, cached=not missing)
+        return np.vstack([vectors[text] for text in texts])
 
-            return results
+    def search_text(self, query_text, top_k=10):
+        """Text-to-image search hydrated with image paths.
+
+        Returns ``(results, timings)``: ``results`` is a list of
+        ``(image_id, path, score)`` best first, ``timings`` holds per-stage
+        milliseconds (tokenize, encode, search, hydrate, total) and whether
+        the query vector came from the cache.
+        """
+        timings = {}
+        if not self.index or not self.ai_handler.model:
+            return [], timings
+
+        start = time.perf_counter()
+        try:
+            text_features = self.encode_query(query_text, timings)
+
+            search_start = time.perf_counter()
+            with self.lock:
+                scores, indices = self.index.search(text_features, top_k)
+            hydrate_start = time.perf_counter()
+
+            # Collect valid results (filter out -1 which means no result)
+            hits = [(int(i), float(score)) for i, score in zip(indices[0], scores[0]) if i != -1]
+            paths = self.db_manager.get_image_paths([image_id for image_id, _ in hits])
+            results = [(image_id, paths[image_id], score) for image_id, score in hits if image_id in paths]
+            end = time.perf_counter()
         except Exception as e:
             print(f"Error during similarity search: {e}")
-            return []
+            return [], timings
+
+        timings.update(search=(hydrate_start - search_start) * 1000, hydrate=(end - hydrate_start) * 1000,
+                       total=(end - start) * 1000)
+        print(f"Search '{query_text}': {format_timings(timings)}")
+        return results, timings
+
+    def search_many(self, queries, top_k=10):
+        """Search many queries with one vectorized FAISS call.
+
+        Each query is either a text string or an image id (int), in which case
+        the stored embedding of that image is the query vector and the image
+        itself is left out of its results ("more like this"). All text queries
+        are encoded in one forward pass. Returns one list of
+        ``(image_id, score)`` per query, in input order; queries that cannot be
+        resolved (unknown image id, model not loaded) get an empty list.
+        """
+        results = [[] for _ in queries]
+        if not self.index or len(queries) == 0:
+            return results
+
+        text_positions = [i for i, query in enumerate(queries) if isinstance(query, str)]
+        image_positions = [i for i, query in enumerate(queries) if isinstance(query, numbers.Integral)]
+        vectors = []
+        positions = []
+        if text_positions and self.ai_handler is not None and self.ai_handler.model:
+            vectors.append(self.encode_queries([queries[i] for i in text_positions]))
+            positions.extend(text_positions)
+        if image_positions:
+            found_ids, embeddings = self.db_manager.get_embeddings_for_images(
+                [queries[i] for i in image_positions])
+            if found_ids:
+                found = set(found_ids)
+                embeddings = np.array(embeddings, dtype=np.float32)
+                faiss.normalize_L2(embeddings)
+                vectors.append(embeddings)
+                # get_embeddings_for_images keeps input order, minus unknown ids
+                positions.extend(i for i in image_positions if int(queries[i]) in found)
+        if not vectors:
+            return results
+
+        matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+        # One extra neighbour so image queries still return top_k after dropping themselves
+        with self.lock:
+            scores, indices = self.index.search(matrix, top_k + 1)
+
+        for row, position in enumerate(positions):
+            query = queries[position]
+            exclude = int(query) if not isinstance(query, str) else None
+            hits = [(int(i), float(score)) for i, score in zip(indices[row], scores[row])
+                    if i != -1 and i != exclude]
+            results[position] = hits[:top_k]
+        return results
+
+    def search_filtered(self, query, top_k=10, **filters):
+        """Top-k search restricted to images matching metadata predicates.
+
+        ``query`` is a text string or an image id (more like this, excluding
+        the image itself); ``filters`` are the predicates of
+        DatabaseManager.get_filtered_image_ids (tags, folder, created_at and
+        dimension bounds). The matching ids come from indexed lookups. Up to
+        FILTER_EXACT_MAX_IDS matches are scored exactly from their stored
+        embeddings; larger sets are passed to FAISS as an id selector, with
+        an exact pass if the index returns fewer hits than exist (e.g. IVF
+        lists not probed). Returns ``(results, timings)`` like search_text;
+        timings also hold the filter stage, match count and strategy.
+        """
+        timings = {}
+        start = time.perf_counter()
+        candidate_ids = self.db_manager.get_filtered_image_ids(**filters)
+        filtered = time.perf_counter()
+        timings.update(filter=(filtered - start) * 1000, matches=len(candidate_ids))
+
+        exclude = None
+        if isinstance(query, str):
+            if not self.ai_handler or not self.ai_handler.model:
+                return [], timings
+            vector = self.encode_query(query, timings)
+        else:
+            exclude = int(query)
+            found_ids, embeddings = self.db_manager.get_embeddings_for_images([exclude])
+            if not found_ids:
+                return [], timings
+            vector = np.array(embeddings, dtype=np.float32)
+            faiss.normalize_L2(vector)
+            candidate_ids = candidate_ids[candidate_ids != exclude]
+        if len(candidate_ids) == 0:
+            return [], timings
+
+        search_start = time.perf_counter()
+        wanted = min(top_k, len(candidate_ids))
+        hits = None
+        if self.index is not None and len(candidate_ids) > self.config.FILTER_EXACT_MAX_IDS:
+            selector = faiss.IDSelectorBatch(candidate_ids)
+            with self.lock:
+                params = search_parameters(self.index_type, self.config, selector)
+                scores, indices = self.index.search(vector, top_k, params=params)
+            hits = [(int(i), float(score)) for i, score in zip(indices[0], scores[0]) if i != -1]
+            timings["strategy"] = "index"
+        if hits is None or len(hits) < wanted:
+            hits = self._exact_search(vector[0], candidate_ids, top_k)
+            timings["strategy"] = "exact" if "strategy" not in timings else "index+exact"
+        hydrate_start = time.perf_counter()
+
+        paths = self.db_manager.get_image_paths([image_id for image_id, _ in hits])
+        results = [(image_id, paths[image_id], score) for image_id, score in hits if image_id in paths]
+        end = time.perf_counter()
+        timings.update(search=(hydrate_start - search_start) * 1000, hydrate=(end - hydrate_start) * 1000,
+                       total=(end - start) * 1000)
+        return results, timings
+
+    def _exact_search(self, vector, candidate_ids, top_k, chunk_size=8192):
+        # Brute-force cosine scores over just the candidates, in bounded chunks
+        best_ids = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(candidate_ids), chunk_size):
+            found_ids, embeddings = self.db_manager.get_embeddings_for_images(candidate_ids[start:start + chunk_size])
+            if not found_ids:
+                continue
+            embeddings = np.array(embeddings, dtype=np.float32)
+            faiss.normalize_L2(embeddings)
+            best_ids = np.concatenate([best_ids, np.asarray(found_ids, dtype=np.int64)])
+            best_scores = np.concatenate([best_scores, embeddings @ vector])
+            if len(best_ids) > top_k:
+                keep = np.argpartition(-best_scores, top_k - 1)[:top_k]
+                best_ids, best_scores = best_ids[keep], best_scores[keep]
+        order = np.argsort(-best_scores)
+        return [(int(best_ids[i]), float(best_scores[i])) for i in order]
+
+    def search_similar_images(self, query_text, top_k=10, **filters):
+        if filters:
+            results, _ = self.search_filtered(query_text, top_k, **filters)
+        else:
+            results, _ = self.search_text(query_text, top_k)
+        return [(image_id, score) for image_id, _, score in results]
+
+
+def format_timings(timings):
+    """One-line per-stage breakdown of a search_text timing dict"""
+    stages = ", ".join(f"{stage} {timings[stage]:.1f}"
+                       for stage in ("filter", "tokenize", "encode", "search", "hydrate") if stage in timings)
+    cached = " (cached query)" if timings.get("cached") else ""
+    return f"{timings.get('total', 0.0):.1f} ms [{stages} ms]{cached}"
@@ -0,0 +1,45 @@
+import json
+import time
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+
+class SearchClient:
+    """Client for SearchService, with the same result shapes as SearchEngine.
+
+    Uses only the standard library, so the GUI can search through a shared
+    service without loading torch, clip or faiss itself. Network and HTTP
+    errors surface as OSError (urllib's URLError/HTTPError).
+    """
+
+    def __init__(self, base_url, timeout=10.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def health(self):
+        return self._get_json("/health")
+
+    def search_text(self, query_text, top_k=10):
+        """Like SearchEngine.search_text: ``(results [(image_id, path, score)], timings)``"""
+        start = time.perf_counter()
+        response = self._get_json("/search?" + urlencode({"q": query_text, "k": top_k}))
+        answer = response["results"][0]
+        timings = dict(answer["timings"], total=(time.perf_counter() - start) * 1000)
+        return [(hit["id"], hit["path"], hit["score"]) for hit in answer["results"]], timings
+
+    def search_many(self, queries, top_k=10):
+        """Like SearchEngine.search_many, but hits are ``(image_id, path, score)``"""
+        body = json.dumps({"queries": list(queries), "top_k": top_k}).encode("utf-8")
+        request = Request(self.base_url + "/search", data=body, headers={"Content-Type": "application/json"})
+        with urlopen(request, timeout=self.timeout) as response:
+            answers = json.load(response)["results"]
+        return [[(hit["id"], hit["path"], hit["score"]) for hit in answer["results"]] for answer in answers]
+
+    def thumbnail(self, image_id):
+        """Encoded thumbnail bytes for an image id"""
+        with urlopen(f"{self.base_url}/thumbnail/{int(image_id)}", timeout=self.timeout) as response:
+            return response.read()
+
+    def _get_json(self, path):
+        with urlopen(self.base_url + path, timeout=self.timeout) as response:
+            return json.load(response)
@@ -0,0 +1,267 @@
+"""
+Local HTTP search service.
+
+One process keeps the CLIP model and the search index resident and serves
+every desktop instance on the machine (``python -m src serve``). Built on
+asyncio streams with a minimal HTTP/1.1 implementation, so it needs no web
+framework. Endpoints:
+
+    GET  /health                  library size, index type, model state
+    GET  /search?q=...&k=10       text search (q may be repeated)
+    GET  /similar?id=...&k=10     more-like-this for a stored image
+    POST /search                  {"queries": [text or image id, ...], "top_k": 10}
+    GET  /thumbnail/<image id>    grid thumbnail bytes
+
+Concurrent queries are coalesced by QueryBatcher, so they share one text
+encoder forward pass and one FAISS search.
+"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class QueryBatcher:
+    """Collects queries arriving within a short window into one search call.
+
+    ``search(queries, top_k)`` is blocking and runs on a single worker
+    thread, so the model and index are only ever used by one batch at a
+    time; queries that arrive while a batch runs form the next one.
+    """
+
+    def __init__(self, search, window_ms, max_batch):
+        self.search = search
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, query, top_k):
+        """Queue one query; resolves to ``(hits, timings)`` once its batch has run"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, top_k, time.perf_counter(), future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            start = time.perf_counter()
+            queries = [query for query, _, _, _ in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.search, queries, max(top_k for _, top_k, _, _ in batch))
+            except Exception as e:
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            end = time.perf_counter()
+            for (_, top_k, queued, future), hits in zip(batch, results):
+                if not future.done():
+                    future.set_result((hits[:top_k], {"queue": (start - queued) * 1000,
+                                                      "search": (end - start) * 1000,
+                                                      "batch": len(batch)}))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class SearchService:
+    MAX_BODY = 1 << 20
+
+    def __init__(self, db_manager, search_engine, thumbnail_cache, config):
+        self.db_manager = db_manager
+        self.search_engine = search_engine
+        self.thumbnail_cache = thumbnail_cache
+        self.config = config
+        self.index_stamp = self._index_stamp()
+        self.batcher = None
+
+    def run(self, host=None, port=None):
+        """Serve until interrupted"""
+        try:
+            asyncio.run(self.serve(host or self.config.SEARCH_SERVICE_HOST,
+                                   port or self.config.SEARCH_SERVICE_PORT))
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self, host, port):
+        self.batcher = QueryBatcher(self._search_batch, self.config.SEARCH_SERVICE_BATCH_WINDOW_MS,
+                                    self.config.SEARCH_SERVICE_MAX_BATCH)
+        batcher_task = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"Search service listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher_task.cancel()
+            self.batcher.close()
+
+    def _search_batch(self, queries, top_k):
+        # Batcher thread. Ingestion elsewhere (GUI or CLI) bumps the database
+        # generation with every batch but persists its index only when done;
+        # keep serving the resident index and reload once a new one is saved.
+        # Never rebuild here: that would take minutes at library scale and
+        # write the index and embedding store while the ingester does too
+        stamp = self._index_stamp()
+        if stamp != self.index_stamp:
+            self.index_stamp = stamp
+            self.search_engine.load_index()
+        results = self.search_engine.search_many(queries, top_k)
+        paths = self.db_manager.get_image_paths({image_id for hits in results for image_id, _ in hits})
+        return [[{"id": image_id, "path": paths[image_id], "score": score}
+                 for image_id, score in hits if image_id in paths] for hits in results]
+
+    def _index_stamp(self):
+        # The sidecar is written after the index file is swapped in
+        try:
+            stat = self.search_engine.meta_path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > self.MAX_BODY:
+                    await self._respond(writer, 413, "application/json", b'{"error": "request too large"}', False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    content_type, payload = await self._dispatch(method, target, body)
+                    status = 200
+                except HTTPError as e:
+                    status, content_type, payload = e.status, "application/json", json.dumps({"error": str(e)}).encode()
+                except Exception as e:
+                    print(f"Error handling {method} {target}: {e}")
+                    status, content_type, payload = 500, "application/json", json.dumps({"error": str(e)}).encode()
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, content_type, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, content_type, payload, keep_alive):
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + payload)
+        await writer.drain()
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        if url.path == "/health" and method == "GET":
+            return self._json(await self._health())
+        if url.path == "/search" and method == "GET":
+            return self._json(await self._search(params.get("q", []), self._top_k(params.get("k"))))
+        if url.path == "/similar" and method == "GET":
+            try:
+                image_ids = [int(value) for value in params.get("id", [])]
+            except ValueError:
+                raise HTTPError(400, "id must be an integer")
+            return self._json(await self._search(image_ids, self._top_k(params.get("k"))))
+        if url.path == "/search" and method == "POST":
+            try:
+                request = json.loads(body or b"{}")
+                queries = request["queries"]
+            except (ValueError, KeyError, TypeError):
+                raise HTTPError(400, "expected {\"queries\": [...]}")
+            if not isinstance(queries, list) or not all(isinstance(q, (str, int)) for q in queries):
+                raise HTTPError(400, "queries must be strings or image ids")
+            return self._json(await self._search(queries, self._top_k([request.get("top_k")])))
+        if url.path.startswith("/thumbnail/") and method == "GET":
+            return await self._thumbnail(url.path[len("/thumbnail/"):])
+        if url.path in ("/health", "/search", "/similar") or url.path.startswith("/thumbnail/"):
+            raise HTTPError(405, f"{method} not allowed on {url.path}")
+        raise HTTPError(404, f"no such endpoint: {url.path}")
+
+    def _top_k(self, values):
+        value = values[-1] if values else None
+        if value is None:
+            return self.config.SIMILARITY_SEARCH_TOP_K
+        try:
+            return max(1, min(int(value), self.config.SEARCH_RESULTS_LIMIT))
+        except (TypeError, ValueError):
+            raise HTTPError(400, "k must be an integer")
+
+    async def _search(self, queries, top_k):
+        if not queries:
+            raise HTTPError(400, "no queries")
+        start = time.perf_counter()
+        answers = await asyncio.gather(*(self.batcher.submit(query, top_k) for query in queries))
+        total = (time.perf_counter() - start) * 1000
+        return {"results": [{"query": query, "results": hits, "timings": dict(timings, total=total)}
+                            for query, (hits, timings) in zip(queries, answers)]}
+
+    async def _health(self):
+        loop = asyncio.get_running_loop()
+        images = await loop.run_in_executor(None, self.db_manager.count_images)
+        index = self.search_engine.index
+        ai_handler = self.search_engine.ai_handler
+        return {"images": images, "indexed": int(index.ntotal) if index is not None else 0,
+                "index_type": self.search_engine.index_type,
+                "model": bool(ai_handler is not None and ai_handler.model)}
+
+    async def _thumbnail(self, image_id):
+        try:
+            image_id = int(image_id)
+        except ValueError:
+            raise HTTPError(400, "image id must be an integer")
+        loop = asyncio.get_running_loop()
+        paths = await loop.run_in_executor(None, self.db_manager.get_image_paths, [image_id])
+        if image_id not in paths:
+            raise HTTPError(404, f"no image {image_id}")
+        thumb_path = await loop.run_in_executor(None, self.thumbnail_cache.get_or_create, paths[image_id])
+        if thumb_path is None:
+            raise HTTPError(404, f"no thumbnail for image {image_id}")
+        with open(thumb_path, "rb") as f:
+            payload = f.read()
+        return ("image/webp" if thumb_path.endswith(".webp") else "image/jpeg"), payload
+
+    @staticmethod
+    def _json(record):
+        return "application/json", json.dumps(record).encode("utf-8")
@@ -0,0 +1,33 @@
+from benchmarks.run import build_parser, compare, run
+
+
+def _results(metrics):
+    return {"metrics": metrics}
+
+
+def test_compare_flags_regressions_by_direction():
+    baseline = _results({"db": {"write_images_per_sec": 1000.0, "query": {"p50_ms": 2.0}, "recall_at_k": 0.9}})
+    current = _results({"db": {"write_images_per_sec": 700.0, "query": {"p50_ms": 2.1}, "recall_at_k": 0.95}})
+    rows = {row["metric"]: row for row in compare(current, baseline, tolerance=0.2)}
+    assert rows["db.write_images_per_sec"]["regression"]
+    assert not rows["db.query.p50_ms"]["regression"]
+    assert not rows["db.recall_at_k"]["regression"]
+
+
+def test_compare_ignores_skipped_sections():
+    baseline = _results({"model": {"analyze_images_per_sec": 10.0}})
+    current = _results({"model": {"skipped": "No module named 'clip'"}})
+    assert compare(current, baseline, tolerance=0.2) == []
+
+
+def test_small_run_produces_metrics():
+    args = build_parser().parse_args(["--vectors", "500", "--dim", "32", "--images", "2", "--image-size", "64", "48",
+                                      "--repeats", "2", "--only", "database", "grid", "thumbnails", "model"])
+    results = run(args)
+    metrics = results["metrics"]
+    assert metrics["database"]["write_images_per_sec"] > 0
+    assert metrics["grid"]["scroll_rows_per_sec"] > 0
+    assert set(metrics["thumbnails"]) == {"cold", "warm"}
+    # The stub model needs neither CLIP nor torch
+    assert metrics["model"]["analyze_images_per_sec"] > 0
+    assert results["parameters"]["vectors"] == 500
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("faiss")
+
+from config.settings import AppConfig
+from src.database.db_manager import DatabaseManager
+from src.ingestion.image_hash import dhash
+from src.search.dedup import DuplicateFinder
+from src.search.search_engine import SearchEngine
+
+
+def _texture(seed, brightness=0):
+    blocks = np.random.default_rng(seed).integers(0, 200, (8, 9, 3))
+    return Image.fromarray((blocks + brightness).astype(np.uint8)).resize((72, 64), Image.Resampling.NEAREST)
+
+
+def _finder(tmp_path, images):
+    """``images`` is ``[(PIL image, embedding), ...]``"""
+    config = AppConfig()
+    config.INDEX_PATH = tmp_path / "faiss.index"
+    db = DatabaseManager(tmp_path / "gallery.db")
+    ids = db.add_images_many([(f"/photos/{i}.png", f"{i}.png", 1, 64, 64, dhash(image))
+                              for i, (image, _) in enumerate(images)])
+    db.add_embeddings_many(ids, [embedding for _, embedding in images])
+    engine = SearchEngine(db, None, config)
+    engine.build_index()
+    return db, DuplicateFinder(db, engine, config)
+
+
+def _embedding(seed):
+    return np.random.default_rng(seed).standard_normal(32).astype(np.float32)
+
+
+def test_flat_colours_are_not_duplicates(tmp_path):
+    flats = [Image.new("RGB", (64, 64), color) for color in ("black", "red", "white", "blue")]
+    assert {dhash(image) for image in flats} == {0}
+    db, finder = _finder(tmp_path, [(image, _embedding(i)) for i, image in enumerate(flats)])
+    assert db.get_phash_pairs() == []
+    assert finder.rebuild() == 0
+
+
+def test_equal_hashes_need_similar_embeddings(tmp_path):
+    base = _embedding(0)
+    images = [(_texture(0), base),
+              (_texture(0, brightness=20), base + 0.01),
+              (_texture(0), _embedding(1))]
+    db, finder = _finder(tmp_path, images)
+    assert len(db.get_phash_pairs()) == 3
+    assert finder.rebuild() == 1
+    assert db.get_duplicate_clusters() == [[1, 2]]
@@ -0,0 +1,84 @@
+import numpy as np
+
+from benchmarks.run import synthetic_embeddings
+from src.database.embedding_store import EmbeddingStore
+
+
+def _unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_put_delete_reopen_is_consistent(tmp_path):
+    rng = np.random.default_rng(0)
+    store = EmbeddingStore(str(tmp_path), dtype="float32")
+    expected = {}
+    # Several batches grow the store past its initial 1024 rows
+    for start in range(0, 3000, 700):
+        ids = list(range(start, start + 700))
+        vectors = rng.standard_normal((700, 8)).astype(np.float32)
+        store.put(ids, vectors)
+        expected.update(zip(ids, vectors))
+    # Overwrite existing rows, then delete from the middle and the end
+    store.put([5, 2999], np.ones((2, 8), dtype=np.float32))
+    expected[5] = expected[2999] = np.ones(8, dtype=np.float32)
+    deleted = list(range(100, 400)) + [2999, 2998, 0]
+    store.delete(deleted + [123456])
+    for image_id in deleted:
+        del expected[image_id]
+    store.flush(generation=7)
+
+    for reopened in (store, EmbeddingStore(str(tmp_path), dtype="float32")):
+        assert reopened.is_synced(7)
+        ids, matrix = reopened.get_all()
+        assert sorted(ids.tolist()) == sorted(expected)
+        for image_id, row in zip(ids.tolist(), matrix):
+            np.testing.assert_array_equal(row, expected[image_id])
+        assert reopened.get(100) is None
+        np.testing.assert_array_equal(reopened.get(5), np.ones(8, dtype=np.float32))
+
+
+def test_float16_store_keeps_search_recall(tmp_path):
+    vectors = np.vstack([chunk for _, chunk in synthetic_embeddings(5000, 512, seed=0)])
+    ids = np.arange(len(vectors))
+    rng = np.random.default_rng(1)
+    queries = _unit(vectors[rng.choice(len(vectors), 200, replace=False)]
+                    + 0.1 * rng.standard_normal((200, 512)).astype(np.float32))
+
+    found = {}
+    for dtype in ("float32", "float16"):
+        (tmp_path / dtype).mkdir()
+        store = EmbeddingStore(str(tmp_path / dtype), dtype=dtype)
+        store.put(ids, vectors)
+        _, matrix = store.get_all()
+        scores = queries @ _unit(np.asarray(matrix, dtype=np.float32)).T
+        found[dtype] = np.argsort(-scores, axis=1)[:, :10]
+
+    recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(found["float16"], found["float32"])])
+    assert recall >= 0.99
+
+
+def test_writers_in_several_processes_stay_consistent(tmp_path):
+    from src.database.db_manager import DatabaseManager
+
+    rng = np.random.default_rng(0)
+
+    def ingest(db, start, n):
+        ids = db.add_images_many([(f"/photos/{i}.jpg", f"{i}.jpg", 1, 1, 1) for i in range(start, start + n)])
+        db.add_embeddings_many(ids, rng.standard_normal((n, 8)).astype(np.float32))
+
+    # Each manager has its own store object, as separate processes would
+    writer = DatabaseManager(tmp_path / "gallery.db", EmbeddingStore(str(tmp_path)))
+    other = DatabaseManager(tmp_path / "gallery.db", EmbeddingStore(str(tmp_path)))
+    ingest(writer, 0, 150)
+    writer.get_all_embeddings()
+    ingest(writer, 150, 100)  # Grows the writer's files to 300 rows
+    other.get_all_embeddings()  # Its store was empty: rebuilds the files under the writer's mapping
+    ingest(writer, 250, 50)  # Fits the writer's 300 rows, so no growth replaces the files again
+
+    fresh = EmbeddingStore(str(tmp_path))
+    if fresh.is_synced(writer.get_generation()):
+        ids, _ = fresh.get_all()
+        assert sorted(ids.tolist()) == list(range(1, 301))
+    ids, embeddings = DatabaseManager(tmp_path / "gallery.db", fresh).get_all_embeddings()
+    assert sorted(ids.tolist()) == list(range(1, 301))
+    np.testing.assert_allclose(fresh.get(300), writer.get_embedding_for_image(300), rtol=1e-3, atol=1e-3)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from config.settings import AppConfig
+from src.database.db_manager import DatabaseManager
+from src.search.search_engine import SearchEngine
+
+
+@pytest.fixture
+def db(tmp_path):
+    """1200 images in two folders with sizes, dates and tags cycling by id"""
+    rng = np.random.default_rng(0)
+    db = DatabaseManager(tmp_path / "gallery.db")
+    ids = db.add_images_many([(f"/photos/{'ab'[i % 2]}/{i}.jpg", f"{i}.jpg", 1, 100 * (i % 10), 100, None)
+                              for i in range(1200)])
+    db.add_embeddings_many(ids, rng.standard_normal((1200, 32)).astype(np.float32))
+    db.add_tags_many([(image_id, [("dog", 0.8 if image_id % 2 else 0.2)]) for image_id in ids[::3]])
+    with db.transaction() as cursor:
+        cursor.executemany('UPDATE images SET created_at = ? WHERE id = ?',
+                           [(f"2024-03-{1 + image_id % 5:02d} 15:30:00", image_id) for image_id in ids])
+    yield db
+    db.close()
+
+
+def test_filters_combine(db):
+    ids = np.arange(1, 1201)
+    assert db.get_filtered_image_ids(folder="/photos/a").tolist() == ids[ids % 2 == 1].tolist()
+    assert db.get_filtered_image_ids(tags="dog").tolist() == ids[::3].tolist()
+    assert db.get_filtered_image_ids(tags=["dog"], min_confidence=0.5).tolist() == ids[::3][ids[::3] % 2 == 1].tolist()
+    assert db.get_filtered_image_ids(min_width=300, max_width=400, max_height=100).tolist() == \
+        ids[np.isin((ids - 1) % 10, (3, 4))].tolist()
+    assert db.get_filtered_image_ids(tags=["cat"]).tolist() == []
+
+
+def test_date_only_bounds_include_the_whole_day(db):
+    ids = np.arange(1, 1201)
+    day = 1 + ids % 5
+    # Every image was created at 15:30 on its day
+    assert db.get_filtered_image_ids(created_before="2024-03-02").tolist() == ids[day <= 2].tolist()
+    assert db.get_filtered_image_ids(created_after="2024-03-04").tolist() == ids[day >= 4].tolist()
+    assert db.get_filtered_image_ids(created_after="2024-03-02", created_before="2024-03-02 12:00:00").tolist() == []
+
+
+@pytest.mark.parametrize("index_type, exact_max_ids, strategy", [
+    ("flat", 20000, "exact"),
+    ("flat", 0, "index"),
+    ("hnsw", 0, "index"),
+    # One probed list holds fewer than top_k matches, so the exact pass fills in
+    ("ivf_flat", 0, "index+exact"),
+])
+def test_search_filtered_matches_brute_force(tmp_path, db, index_type, exact_max_ids, strategy):
+    config = AppConfig()
+    config.INDEX_PATH = tmp_path / "faiss.index"
+    config.FAISS_INDEX_TYPE = index_type
+    config.FAISS_NLIST = 16
+    config.FAISS_NPROBE = 1
+    config.FILTER_EXACT_MAX_IDS = exact_max_ids
+    engine = SearchEngine(db, None, config)
+    engine.build_index()
+
+    results, timings = engine.search_filtered(1, top_k=20, folder="/photos/b", tags=["dog"])
+    candidates = db.get_filtered_image_ids(folder="/photos/b", tags=["dog"])
+    assert timings["matches"] == len(candidates) == 200
+    assert timings["strategy"] == strategy
+
+    found_ids, embeddings = db.get_embeddings_for_images(candidates.tolist() + [1])
+    embeddings = np.array(embeddings, dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    scores = embeddings[:-1] @ embeddings[-1]
+    expected = [found_ids[i] for i in np.argsort(-scores)[:20]]
+    assert all(path.startswith("/photos/b/") for _, path, _ in results)
+    if strategy == "index" and index_type == "hnsw":
+        assert len(set(image_id for image_id, _, _ in results) & set(expected)) >= 18
+    else:
+        assert [image_id for image_id, _, _ in results] == expected
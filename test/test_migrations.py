@@ -0,0 +1,58 @@
+import sqlite3
+import numpy as np
+
+from src.database.db_manager import DatabaseManager
+from src.database.migrations import SCHEMA_VERSION
+
+
+def _v0_database(path):
+    """A library written before migrations existed: tag names stored per row"""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT UNIQUE NOT NULL, filename TEXT NOT NULL,
+            size INTEGER, width INTEGER, height INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, processed BOOLEAN DEFAULT FALSE
+        );
+        CREATE TABLE tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, image_id INTEGER, tag TEXT NOT NULL,
+            confidence REAL DEFAULT 0.0, FOREIGN KEY (image_id) REFERENCES images (id)
+        );
+        CREATE TABLE embeddings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, image_id INTEGER UNIQUE, embedding BLOB,
+            FOREIGN KEY (image_id) REFERENCES images (id)
+        );
+    ''')
+    conn.executemany('INSERT INTO images (path, filename, size, width, height) VALUES (?, ?, ?, ?, ?)',
+                     [("/photos/a.jpg", "a.jpg", 10, 640, 480), ("/photos/b.jpg", "b.jpg", 20, 800, 600)])
+    conn.executemany('INSERT INTO tags (image_id, tag, confidence) VALUES (?, ?, ?)', [
+        (1, "dog", 0.4), (1, "beach", 0.3),
+        (1, "dog", 0.6),  # Re-processing used to append rather than replace
+        (2, "cat", 0.9),
+        (None, "orphan", 0.5),
+    ])
+    conn.execute('INSERT INTO embeddings (image_id, embedding) VALUES (?, ?)',
+                 (1, np.arange(4, dtype=np.float32).tobytes()))
+    conn.commit()
+    conn.close()
+
+
+def test_v0_library_is_migrated_without_losing_data(tmp_path):
+    path = tmp_path / "gallery.db"
+    _v0_database(path)
+    db = DatabaseManager(path)
+
+    assert db.get_connection().execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    assert [row[:3] for row in db.get_images()] == [(1, "/photos/a.jpg", "a.jpg"), (2, "/photos/b.jpg", "b.jpg")]
+    assert db.get_tags_for_image(1) == [("dog", 0.6), ("beach", 0.3)]
+    assert db.get_tags_for_image(2) == [("cat", 0.9)]
+    assert [row[0] for row in db.get_images_with_tag("dog", min_confidence=0.5)] == [1]
+    assert db.get_images_with_tag("orphan") == []
+    np.testing.assert_array_equal(db.get_embedding_for_image(1), np.arange(4, dtype=np.float32))
+    assert db.get_generation() == 0
+    db.close()
+
+    # Reopening applies nothing and keeps the data
+    db = DatabaseManager(path)
+    assert db.get_tags_for_image(1) == [("dog", 0.6), ("beach", 0.3)]
+    db.close()
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("torch")
+pytest.importorskip("clip")
+
+from config.settings import AppConfig
+from src.ai.model_handler import AIModelHandler
+
+
+def _config(tmp_path, backend):
+    config = AppConfig()
+    config.DEVICE = "cpu"
+    config.MODELS_DIR = tmp_path
+    config.INFERENCE_BACKEND = backend
+    return config
+
+
+def _images():
+    rng = np.random.default_rng(0)
+    images = [Image.fromarray(rng.integers(0, 256, (240, 320, 3), dtype=np.uint8))]
+    for color in [(200, 30, 30), (30, 200, 30), (30, 30, 200)]:
+        gradient = np.linspace(0, 1, 256)[:, None, None] * np.array(color)[None, None, :]
+        images.append(Image.fromarray(np.repeat(gradient, 256, axis=1).astype(np.uint8)))
+    return images
+
+
+def _cosine(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+@pytest.fixture(scope="module")
+def reference(tmp_path_factory):
+    handler = AIModelHandler(_config(tmp_path_factory.mktemp("fp32"), "torch"))
+    assert handler.backend == "torch"
+    return handler
+
+
+@pytest.mark.parametrize("backend, min_similarity", [("torch_int8", 0.98), ("onnx", 0.99)])
+def test_backend_agrees_with_fp32(reference, tmp_path, backend, min_similarity):
+    if backend == "onnx":
+        pytest.importorskip("onnxruntime")
+    handler = AIModelHandler(_config(tmp_path, backend))
+    assert handler.backend == backend
+
+    images = _images()
+    expected, _ = reference.analyze(images)
+    actual, _ = handler.analyze(images)
+    assert actual.shape == expected.shape
+    assert _cosine(actual, expected).min() >= min_similarity
+
+    texts = ["a photo of a dog", "a red gradient", "a city at night"]
+    expected = reference.encode_text(reference.preprocess_text(texts))
+    actual = handler.encode_text(handler.preprocess_text(texts))
+    assert _cosine(actual, expected).min() >= min_similarity
+
+    # The second load reuses the converted model cached in MODELS_DIR
+    cached = AIModelHandler(_config(tmp_path, backend))
+    assert cached.backend == backend
+    np.testing.assert_allclose(cached.analyze(images)[0], handler.analyze(images)[0], rtol=1e-4, atol=1e-4)
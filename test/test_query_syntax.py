@@ -0,0 +1,15 @@
+from src.search.query_syntax import parse_query
+
+
+def test_filters_are_split_from_text():
+    assert parse_query('beach tag:dog tag:cat folder:"/photos/2023 trip" minwidth:800') == (
+        "beach", {"tags": ["dog", "cat"], "folder": "/photos/2023 trip", "min_width": 800})
+
+
+def test_backslashes_and_apostrophes_are_literal():
+    assert parse_query(r"folder:C:\Users\me\Photos dog's toy tag:dog") == (
+        "dog's toy", {"folder": r"C:\Users\me\Photos", "tags": ["dog"]})
+
+
+def test_malformed_filters_stay_in_text():
+    assert parse_query('minwidth:wide tag: "open quote') == ("minwidth:wide tag: open quote", {})
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from config.settings import AppConfig
+from src.ai.model_handler import AIModelHandler
+from src.ai.retag import select_tags
+
+
+class _Handler(AIModelHandler):
+    # _select_tags only needs the config
+    def load_model(self):
+        pass
+
+
+@pytest.mark.parametrize("threshold, max_tags", [(0.1, 5), (0.02, 3), (0.0, 50), (0.5, 5), (0.1, 0)])
+def test_select_tags_matches_per_image_selection(threshold, max_tags):
+    config = AppConfig()
+    config.TAG_CONFIDENCE_THRESHOLD = threshold
+    config.MAX_TAGS_PER_IMAGE = max_tags
+    handler = _Handler(config)
+    rng = np.random.default_rng(0)
+    logits = rng.standard_normal((64, len(config.DEFAULT_LABELS))) * 3
+    probs = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+
+    rows, labels, confidences = select_tags(probs, threshold, max_tags)
+    for row in range(len(probs)):
+        kept = sorted(((config.DEFAULT_LABELS[label], float(confidence))
+                       for label, confidence in zip(labels[rows == row], confidences[rows == row])),
+                      key=lambda tag: tag[1], reverse=True)
+        assert kept == handler._select_tags(probs[row])
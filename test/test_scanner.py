@@ -0,0 +1,49 @@
+import os
+
+from config.settings import AppConfig
+from src.database.db_manager import DatabaseManager
+from src.ingestion.image_hash import content_hash
+from src.ingestion.scanner import scan_folder
+
+
+def _write(path, data, mtime_ns):
+    path.write_bytes(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+
+def test_scan_classifies_files_against_the_database(tmp_path):
+    folder = tmp_path / "photos"
+    folder.mkdir()
+    config = AppConfig()
+    config.MAX_IMAGE_SIZE = 100
+    db = DatabaseManager(tmp_path / "gallery.db")
+
+    # Record a processed library as the last ingestion left it
+    recorded = {name: _write(folder / name, name.encode().ljust(16), 10 ** 18)
+                for name in ("unchanged.jpg", "touched.jpg", "modified.jpg", "unprocessed.jpg",
+                             "vanished.jpg", "oversized.jpg")}
+    ids = db.add_images_many([(path, os.path.basename(path), 16, 1, 1, None, 10 ** 18, content_hash(path))
+                              for path in recorded.values()])
+    ids = dict(zip(recorded, ids))
+    with db.transaction() as cursor:
+        cursor.execute('UPDATE images SET processed = TRUE WHERE id != ?', (ids["unprocessed.jpg"],))
+
+    # Then the folder changes underneath it
+    os.utime(recorded["touched.jpg"], ns=(2 * 10 ** 18, 2 * 10 ** 18))
+    _write(folder / "modified.jpg", b"other bytes, same".ljust(16)[:16], 2 * 10 ** 18)
+    os.remove(recorded["vanished.jpg"])
+    _write(folder / "oversized.jpg", b"x" * 200, 10 ** 18)
+    new = _write(folder / "new.png", b"new", 10 ** 18)
+    _write(folder / "notes.txt", b"not an image", 10 ** 18)
+
+    result = scan_folder(folder, config, db)
+    assert sorted(result.to_process) == sorted([recorded["modified.jpg"], recorded["unprocessed.jpg"], new])
+    assert result.unchanged == 2
+    assert result.touched == [(2 * 10 ** 18, ids["touched.jpg"])]
+    # Filtered out by size, but still on disk
+    assert result.vanished == [ids["vanished.jpg"]]
+
+    db.update_mtimes(result.touched)
+    assert scan_folder(folder, config, db).touched == []
+    db.close()
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from config.settings import AppConfig
+from src.database.db_manager import DatabaseManager
+from src.search.search_engine import SearchEngine
+
+
+def _vectors(rng, n, d=32):
+    vectors = rng.standard_normal((n, d)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _add(db, rng, start, n):
+    ids = db.add_images_many([(f"/photos/{i}.jpg", f"{i}.jpg", 1, 1, 1) for i in range(start, start + n)])
+    vectors = _vectors(rng, n)
+    db.add_embeddings_many(ids, vectors)
+    return ids, vectors
+
+
+def _engine(tmp_path, db, index_type):
+    config = AppConfig()
+    config.INDEX_PATH = tmp_path / "faiss.index"
+    config.FAISS_INDEX_TYPE = index_type
+    # Small enough to train quickly; every list is probed
+    config.FAISS_NLIST = 16
+    config.FAISS_NPROBE = 16
+    engine = SearchEngine(db, None, config)
+    engine.load_or_build_index()
+    return engine
+
+
+# ivf_pq shares the inverted lists of ivf_flat, and its PQ training is slow
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf_flat"])
+def test_persisted_index_survives_updates_across_restarts(tmp_path, index_type):
+    n = 2000
+    rng = np.random.default_rng(0)
+    db = DatabaseManager(tmp_path / "gallery.db")
+    _add(db, rng, 0, n)
+    _engine(tmp_path, db, index_type)
+
+    # Restart, then ingest, delete and persist through the loaded index
+    engine = _engine(tmp_path, db, index_type)
+    assert engine.index_type == index_type
+    new_ids, new_vectors = _add(db, rng, n, 50)
+    engine.add_embeddings(new_ids, new_vectors)
+    db.delete_images(new_ids[:10])
+    engine.remove_images(new_ids[:10])
+    engine.save_index()
+
+    # Restart without changes: saving again must not clobber the file
+    engine = _engine(tmp_path, db, index_type)
+    engine.save_index()
+
+    engine = _engine(tmp_path, db, index_type)
+    assert engine.load_index()
+    assert engine.index.ntotal == n + 40
+    _, found = engine.index.search(new_vectors[10:], 1)
+    assert found[:, 0].tolist() == new_ids[10:]
+    db.close()
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf_flat"])
+def test_reprocessed_images_replace_their_vectors(tmp_path, index_type):
+    rng = np.random.default_rng(0)
+    db = DatabaseManager(tmp_path / "gallery.db")
+    ids, vectors = _add(db, rng, 0, 2000)
+    engine = _engine(tmp_path, db, index_type)
+
+    # Modified files are re-ingested under their existing ids
+    updated = _vectors(rng, 5)
+    db.add_embeddings_many(ids[:5], updated)
+    engine.add_embeddings(ids[:5], updated)
+    engine.save_index()
+
+    for engine in (engine, _engine(tmp_path, db, index_type)):
+        assert engine.index.ntotal == 2000
+        _, found = engine.index.search(updated, 1)
+        assert found[:, 0].tolist() == ids[:5]
+        _, found = engine.index.search(vectors[:5], 1)
+        assert not set(found[:, 0].tolist()) & set(ids[:5])
+    db.close()